@@ -1,10 +1,26 @@
-from django.http import JsonResponse
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.views.decorators.http import require_http_methods
-from django.db.models import Q
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition, require_http_methods
+from django.db.models import Count, Q
 from django.db import transaction
 from django.core.paginator import Paginator
-from .models import Category, Attribute
+from .cache import invalidate_tree, tree_snapshot_json, tree_version
+from .export import EXPORT_FORMATS, export_chunks
+from .facets import resolve_product_types
+from .models import Category, Attribute, EffectiveAttribute
+from .pagination import keyset_page
+from .paths import category_id_for_path
+from .propagation import BATCH_SIZE, assign_with_ancestors, attributes_not_assigned
+from .search import (
+    autocomplete_categories, prefix_attributes, rank_attributes, rank_categories, search_backend,
+)
 
 
 @require_http_methods(["POST"])
@@ -59,10 +75,7 @@ def update_category(request, pk):
         
         new_parent = None
         if parent_id:
-            new_parent = get_object_or_404(
-                Category.objects.only('id', 'path'),
-                id=parent_id
-            )
+            new_parent = get_object_or_404(Category, id=parent_id)
         
         old_name = category.name
         name_changed = new_name != old_name
@@ -71,22 +84,7 @@ def update_category(request, pk):
         if not name_changed and not parent_changed:
             return JsonResponse({'success': False, 'error': 'No changes detected'}, status=400)
         
-        category = Category.objects.only('name', 'path', 'parent_id').get(pk=pk)
-        
-        with transaction.atomic():
-            if name_changed:
-                category.name = new_name
-            if parent_changed:
-                category.parent = new_parent
-            
-            if name_changed or parent_changed:
-                category.save()
-                
-                if name_changed or parent_changed:
-                    category.update_paths_for_subtree()
-                
-                if parent_changed:
-                    category.synchronize_attributes_with_ancestors()
+        category.rename_and_move(new_name, new_parent)
         
         return JsonResponse({
             'success': True,
@@ -94,6 +92,7 @@ def update_category(request, pk):
             'category': {
                 'id': category.id,
                 'name': category.name,
+                'path': category.path,
                 'parent_id': category.parent_id
             }
         })
@@ -106,73 +105,160 @@ def update_category(request, pk):
 def delete_category(request, pk):
     try:
         category = get_object_or_404(Category, pk=pk)
-        # Delete all descendants and their attribute associations
-        descendants = category.get_descendants()
-        for desc in descendants:
-            desc.attributes.clear()
-            desc.delete()
-        # Delete attribute associations for the category itself
-        category.attributes.clear()
-        category.delete()
-        return JsonResponse({'success': True, 'message': f"Category deleted successfully"})
+        deleted = category.delete_subtree()
+        return JsonResponse({
+            'success': True,
+            'message': f"Category deleted successfully",
+            'deleted': deleted,
+        })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
 
+def tree_etag(request, *args, **kwargs):
+    """ETag for read endpoints: the tree version plus the query string."""
+    return version_etag(request, tree_version())
+
+
+def version_etag(request, version):
+    query = request.GET.urlencode()
+    return f"{version}-{query}" if query else str(version)
+
+
+@condition(etag_func=tree_etag)
+def category_tree_snapshot(request):
+    """Whole hierarchy (ids, names, paths, parents, attribute counts) in one response.
+
+    The serialized snapshot is cached per tree version and clients sending
+    ``If-None-Match`` get a 304 until a category or attribute changes.
+    """
+    response = HttpResponse(tree_snapshot_json(tree_version()), content_type='application/json')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@condition(etag_func=tree_etag)
 def search_categories(request):
     query = request.GET.get('q', '')
     exclude_id = request.GET.get('exclude', '')
     
-    categories = Category.objects.all()
-    
-    if query:
-        categories = categories.filter(name__icontains=query)
+    if query.strip() and search_backend() == 'memory':
+        rows = autocomplete_categories(query, exclude_id=int(exclude_id) if exclude_id.isdigit() else None)
+        return JsonResponse({'results': [search_result(*row) for row in rows]})
     
+    exclude_category = None
     if exclude_id:
         try:
             exclude_category = Category.objects.get(id=exclude_id)
-            descendants = exclude_category.get_descendants()
-            categories = categories.exclude(
-                Q(id=exclude_id) | 
-                Q(id__in=descendants.values_list('id', flat=True))
-            )
         except Category.DoesNotExist:
             pass
     
-    results = []
-    for cat in categories[:100]:
-        path_parts = cat.path.split('__')
-        display_path = ' → '.join(path_parts)
-        results.append({
-            'id': str(cat.id),
-            'text': cat.name,
-            'path': display_path
-        })
+    categories = search_categories_queryset(query, exclude_category)
+    results = [search_result(*row) for row in categories.values_list('id', 'name', 'path')[:100]]
     
     return JsonResponse({'results': results})
 
 
-def category_tree(request):
-    """Returns category data in jstree format with attribute info"""
-    parent_id = request.GET.get('id', '')
-    if parent_id == '#':
-        parent_id = ''
+def search_categories_queryset(query, exclude_category=None):
+    """Categories matching ``query``, outside the subtree of ``exclude_category``."""
+    categories = Category.objects.all()
     
-    categories = Category.objects.filter(parent__id=parent_id) if parent_id else Category.objects.filter(parent__isnull=True)
+    if exclude_category is not None:
+        descendants = exclude_category.get_descendants()
+        categories = categories.exclude(
+            Q(id=exclude_category.id) | 
+            Q(id__in=descendants.values_list('id', flat=True))
+        )
     
+    if query:
+        categories = rank_categories(categories, query)
+    return categories
+
+
+def search_result(pk, name, path):
+    return {
+        'id': str(pk),
+        'text': name,
+        'path': ' → '.join(path.split('__'))
+    }
+
+
+MAX_TREE_DEPTH = 10
+
+
+def tree_depth(request):
+    try:
+        return min(max(int(request.GET.get('depth', 1)), 1), MAX_TREE_DEPTH)
+    except ValueError:
+        return 1
+
+
+def tree_rows(categories):
+    return categories.annotate(attribute_count=Count('attributes')).values(
+        'id', 'name', 'parent_id', 'lft', 'rght', 'level', 'attribute_count'
+    ).order_by('tree_id', 'lft')
+
+
+def nest_tree_rows(rows, top_level, depth):
+    """Nest rows in tree order as jstree nodes, ``depth`` levels below ``top_level``."""
     data = []
-    for category in categories:
-        data.append({
-            'id': str(category.id),
-            'text': category.name,
-            'children': category.get_children().exists(),
+    nodes = {}
+    for row in rows:
+        if top_level is None:
+            top_level = row['level']
+        has_children = row['rght'] - row['lft'] > 1
+        node = {
+            'id': str(row['id']),
+            'text': row['name'],
+            'children': [] if has_children and row['level'] < top_level + depth - 1 else has_children,
             'type': 'default',
             'data': {
-                'attribute_count': category.attributes.count()
+                'attribute_count': row['attribute_count']
             }
-        })
-    
-    return JsonResponse(data, safe=False)
+        }
+        nodes[row['id']] = node
+        if row['level'] == top_level:
+            data.append(node)
+        else:
+            nodes[row['parent_id']]['children'].append(node)
+    return data
+
+
+def subtree_categories(parent, depth):
+    return Category.objects.filter(
+        tree_id=parent.tree_id,
+        lft__gt=parent.lft,
+        rght__lt=parent.rght,
+        level__lte=parent.level + depth,
+    )
+
+
+@condition(etag_func=tree_etag)
+def category_tree(request):
+    """Returns category data in jstree format with attribute info.
+
+    ``depth`` (default 1) returns that many levels below ``id`` nested in
+    ``children``. Child existence comes from the MPTT ``lft``/``rght`` columns
+    and attribute counts from one aggregate, so the whole response is a
+    single query (plus a lookup of the parent when ``depth`` > 1).
+    """
+    parent_id = request.GET.get('id', '')
+    if parent_id == '#':
+        parent_id = ''
+    depth = tree_depth(request)
+
+    if not parent_id:
+        categories = Category.objects.filter(level__lt=depth)
+        top_level = 0
+    elif depth == 1:
+        categories = Category.objects.filter(parent__id=parent_id)
+        top_level = None
+    else:
+        parent = get_object_or_404(Category.objects.only('tree_id', 'lft', 'rght', 'level'), id=parent_id)
+        categories = subtree_categories(parent, depth)
+        top_level = parent.level + 1
+
+    return JsonResponse(nest_tree_rows(tree_rows(categories), top_level, depth), safe=False)
 
 
 def category_attributes(request, pk):
@@ -188,22 +274,19 @@ def category_attributes(request, pk):
     attr_search = request.GET.get('assigned_search', '').strip()
     avail_search = request.GET.get('available_search', '').strip()
 
-    # Assigned attributes queryset with search
-    attributes_qs = category.attributes.values('id', 'name')
-    if attr_search:
-        attributes_qs = attributes_qs.filter(name__icontains=attr_search)
+    attributes_qs, available_qs = category_attribute_querysets(category.pk, attr_search, avail_search)
+
+    if request.GET.get('paginate') == 'keyset':
+        return category_attributes_keyset(request, attributes_qs, available_qs, attr_per_page, avail_per_page)
+
     attributes_paginator = Paginator(attributes_qs, attr_per_page)
     attributes_page = attributes_paginator.get_page(attr_page)
 
-    # Available attributes queryset with search
-    available_qs = Attribute.objects.exclude(categories=category).values('id', 'name')
-    if avail_search:
-        available_qs = available_qs.filter(name__icontains=avail_search)
     available_paginator = Paginator(available_qs, avail_per_page)
     available_page = available_paginator.get_page(avail_page)
 
     return JsonResponse({
-        'attributes': list(attributes_page),
+        'attributes': [assigned_attribute(row) for row in attributes_page],
         'attributes_page': attributes_page.number,
         'attributes_num_pages': attributes_paginator.num_pages,
         'attributes_count': attributes_paginator.count,
@@ -216,6 +299,72 @@ def category_attributes(request, pk):
         'available_attributes_per_page': avail_per_page,
     })
 
+
+def category_attribute_querysets(category_id, attr_search='', avail_search=''):
+    """Return the (assigned, available) attribute querysets of ``category_attributes``."""
+    # Assigned attributes queryset with search, read from the effective-attribute table
+    attributes_qs = EffectiveAttribute.objects.filter(category_id=category_id)
+    if attr_search and search_backend() == 'memory':
+        attributes_qs = prefix_attributes(attributes_qs, attr_search, attribute_field='attribute')
+    elif attr_search:
+        attributes_qs = rank_attributes(attributes_qs, attr_search, attribute_field='attribute')
+    else:
+        attributes_qs = attributes_qs.order_by('attribute__name')
+    attributes_qs = attributes_qs.values('attribute_id', 'attribute__name', 'inherited', 'source_id')
+
+    available_qs = attributes_not_assigned(category_id)
+    if avail_search and search_backend() == 'memory':
+        available_qs = prefix_attributes(available_qs, avail_search)
+    elif avail_search:
+        available_qs = rank_attributes(available_qs, avail_search)
+    available_qs = available_qs.values('id', 'name')
+    return attributes_qs, available_qs
+
+
+def assigned_attribute(row):
+    return {
+        'id': row['attribute_id'],
+        'name': row['attribute__name'],
+        'inherited': row['inherited'],
+        'source_id': row['source_id'],
+    }
+
+
+def category_attributes_keyset(request, attributes_qs, available_qs, attr_per_page, avail_per_page):
+    """Cursor-paginated form of ``category_attributes`` (``?paginate=keyset``).
+
+    Both lists are ordered by (name, id) and continue from the
+    ``assigned_cursor``/``available_cursor`` returned with the previous page,
+    so every page costs the same. Counts are planner estimates on large lists.
+    """
+    return JsonResponse(keyset_payload(request, attributes_qs, available_qs, attr_per_page, avail_per_page))
+
+
+def keyset_payload(request, attributes_qs, available_qs, attr_per_page, avail_per_page):
+    attributes_page = keyset_page(
+        attributes_qs,
+        request.GET.get('assigned_cursor'),
+        attr_per_page,
+        fields=('attribute__name', 'attribute_id'),
+    )
+    available_page = keyset_page(available_qs, request.GET.get('available_cursor'), avail_per_page)
+
+    return {
+        'attributes': [assigned_attribute(row) for row in attributes_page],
+        'attributes_next_cursor': attributes_page.next_cursor,
+        'attributes_previous_cursor': attributes_page.previous_cursor,
+        'attributes_count': attributes_page.count,
+        'attributes_count_is_approximate': attributes_page.count_is_approximate,
+        'attributes_per_page': attr_per_page,
+
+        'available_attributes': list(available_page),
+        'available_attributes_next_cursor': available_page.next_cursor,
+        'available_attributes_previous_cursor': available_page.previous_cursor,
+        'available_attributes_count': available_page.count,
+        'available_attributes_count_is_approximate': available_page.count_is_approximate,
+        'available_attributes_per_page': avail_per_page,
+    }
+
 def category_add_attribute(request, category_pk, attribute_pk):
     category = get_object_or_404(Category, pk=category_pk)
     attribute = get_object_or_404(Attribute, pk=attribute_pk)
@@ -258,6 +407,129 @@ def category_add_attribute_by_name(request, category_pk):
     })
 
 
+def _parse_assignment(item):
+    """Return a ``(category_id, attribute)`` pair, or ``None`` if malformed."""
+    if isinstance(item, dict):
+        category, attribute = item.get('category'), item.get('attribute')
+    elif isinstance(item, (list, tuple)) and len(item) == 2:
+        category, attribute = item
+    else:
+        return None
+
+    # bool is an int subclass, and JSON true must not mean category 1
+    if isinstance(category, bool) or not isinstance(category, int):
+        return None
+
+    if isinstance(attribute, str):
+        attribute = attribute.strip()
+        if not attribute:
+            return None
+    elif isinstance(attribute, bool) or not isinstance(attribute, int):
+        return None
+    return category, attribute
+
+
+def service_token_or_csrf(view):
+    """Accept ``Authorization: Bearer <CATEGORY_SYNC_TOKEN>`` in place of a CSRF token.
+
+    Service callers have no CSRF cookie; requests without the header are
+    checked like any browser form post, a wrong token is refused outright.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        header = request.headers.get('Authorization')
+        if header is None:
+            return protected(request, *args, **kwargs)
+        token = getattr(settings, 'CATEGORY_SYNC_TOKEN', '')
+        if not token or not constant_time_compare(header, f"Bearer {token}"):
+            return JsonResponse({'success': False, 'error': 'Invalid service token'}, status=403)
+        return view(request, *args, **kwargs)
+    return csrf_exempt(wrapped)
+
+
+@service_token_or_csrf
+@require_http_methods(["POST"])
+def category_bulk_add_attributes(request):
+    """
+    Add many attributes to many categories (and their ancestors) in one request.
+    Services authenticate with the sync token, browsers with the CSRF token.
+    Expects JSON body: {"assignments": [{"category": 1, "attribute": "Color"}, [2, 15], ...]}
+    An integer attribute is an attribute id, a string is a name (created if needed).
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON body'}, status=400)
+
+    assignments = payload.get('assignments') if isinstance(payload, dict) else payload
+    if not isinstance(assignments, list) or not assignments:
+        return JsonResponse({'success': False, 'error': 'A non-empty "assignments" list is required'}, status=400)
+
+    pairs = set()
+    for index, item in enumerate(assignments):
+        pair = _parse_assignment(item)
+        if pair is None:
+            return JsonResponse({'success': False, 'error': f"Invalid assignment at index {index}"}, status=400)
+        pairs.add(pair)
+
+    category_ids = {category_id for category_id, _ in pairs}
+    attribute_names = {attribute for _, attribute in pairs if isinstance(attribute, str)}
+    attribute_ids = {attribute for _, attribute in pairs if isinstance(attribute, int)}
+
+    missing_categories = category_ids - set(
+        Category.objects.filter(id__in=category_ids).values_list('id', flat=True)
+    )
+    if missing_categories:
+        return JsonResponse({
+            'success': False,
+            'error': 'Unknown categories',
+            'missing_categories': sorted(missing_categories),
+        }, status=400)
+
+    missing_attributes = attribute_ids - set(
+        Attribute.objects.filter(id__in=attribute_ids).values_list('id', flat=True)
+    )
+    if missing_attributes:
+        return JsonResponse({
+            'success': False,
+            'error': 'Unknown attributes',
+            'missing_attributes': sorted(missing_attributes),
+        }, status=400)
+
+    with transaction.atomic():
+        ids_by_name = dict(Attribute.objects.filter(name__in=attribute_names).values_list('name', 'id'))
+        new_names = attribute_names - ids_by_name.keys()
+        if new_names:
+            Attribute.objects.bulk_create(
+                [Attribute(name=name) for name in new_names],
+                ignore_conflicts=True,
+                batch_size=BATCH_SIZE,
+            )
+            ids_by_name.update(Attribute.objects.filter(name__in=new_names).values_list('name', 'id'))
+            invalidate_tree()
+
+        resolved = {
+            (category_id, ids_by_name[attribute] if isinstance(attribute, str) else attribute)
+            for category_id, attribute in pairs
+        }
+        touched_attributes = {attribute_id for _, attribute_id in resolved}
+        assignments_created = assign_with_ancestors(resolved, count_created=True)
+
+    return JsonResponse({
+        'success': True,
+        'summary': {
+            'received': len(assignments),
+            'unique_pairs': len(resolved),
+            'categories': len(category_ids),
+            'attributes': len(touched_attributes),
+            'attributes_created': len(new_names),
+            'assignments_created': assignments_created,
+        }
+    })
+
+
 @require_http_methods(["POST"])
 def category_remove_attribute(request, category_pk, attribute_pk):
     category = get_object_or_404(Category, pk=category_pk)
@@ -280,7 +552,9 @@ def search_attributes(request):
     if not query:
         return JsonResponse({'success': False, 'error': 'Category name query is required'}, status=400)
 
-    attributes = Attribute.objects.filter(categories__path=query).distinct()
+    # The path resolves from a memo, so only the through table is read
+    category_id = category_id_for_path(query)
+    attributes = Attribute.objects.filter(categories__id=category_id) if category_id else []
 
     results = [
         {'id': attr.id, 'name': attr.name}
@@ -288,3 +562,64 @@ def search_attributes(request):
     ]
 
     return JsonResponse({'success': True, 'attributes': results})
+
+
+MAX_FACET_BATCH = 1000
+
+
+# Read-only, so the batch POST needs no CSRF token (callers are services, not browsers)
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def resolve_facets(request):
+    """Attributes that apply to feed product types ("A > B > C").
+
+    GET ?product_type=... resolves one; POST {"product_types": [...]} up to
+    MAX_FACET_BATCH at once. Answers come from a per-process cache that is
+    dropped whenever the tree changes.
+    """
+    if request.method == 'GET':
+        product_type = request.GET.get('product_type', '').strip()
+        if not product_type:
+            return JsonResponse({'success': False, 'error': 'product_type is required'}, status=400)
+        result = resolve_product_types([product_type])[0]
+        if result['category_id'] is None:
+            return JsonResponse({'success': False, 'error': 'No category matches this product_type', **result},
+                                status=404)
+        return JsonResponse({'success': True, **result})
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON body'}, status=400)
+
+    product_types = payload.get('product_types') if isinstance(payload, dict) else None
+    if not isinstance(product_types, list) or not all(isinstance(item, str) for item in product_types):
+        return JsonResponse({'success': False, 'error': 'A "product_types" list of strings is required'}, status=400)
+    if len(product_types) > MAX_FACET_BATCH:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {MAX_FACET_BATCH} product types per request',
+        }, status=400)
+
+    return JsonResponse({'success': True, 'results': resolve_product_types(product_types)})
+
+
+def export_category_attributes(request):
+    """Stream every category → attribute assignment.
+
+    ``?format=csv`` (default) gives ``category_path,attribute`` rows,
+    ``?format=jsonl`` one ``{"id", "path", "attributes"}`` object per category.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': f"Unknown format, expected one of: {', '.join(EXPORT_FORMATS)}",
+        }, status=400)
+
+    content_type, chunks = EXPORT_FORMATS[export_format]
+    # Under ASGI a sync iterator would be read into memory in full before sending
+    content = export_chunks(export_format) if isinstance(request, ASGIRequest) else chunks()
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="category_attributes.{export_format}"'
+    return response
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CategoriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'categories'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import schedule_prefix_index_warmup
+
+        schedule_prefix_index_warmup()
@@ -0,0 +1,153 @@
+"""Async variants of the read-only JSON endpoints, for deployment under ASGI.
+
+A sync view served by ASGI occupies a worker thread for the whole request.
+These views await the async ORM instead, so a burst of autocomplete requests
+waits on the database without holding a thread per request. Responses are
+identical to the views in ``api.py``; request parsing and serialization are
+shared with them. Helpers that may build a search index or memo
+synchronously are called through ``sync_to_async``.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .api import (
+    assigned_attribute, category_attribute_querysets, keyset_payload, nest_tree_rows,
+    search_categories_queryset, search_result, subtree_categories, tree_depth, tree_rows, version_etag,
+)
+from .cache import atree_version
+from .models import Attribute, Category
+from .pagination import aget_page
+from .paths import category_id_for_path
+from .search import autocomplete_categories, search_backend
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+def tree_condition(view):
+    """``condition(etag_func=tree_etag)`` for async views.
+
+    ``condition`` calls its ETag function synchronously, which would read the
+    tree version from the cache on the event loop; this awaits it instead.
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        etag = quote_etag(version_etag(request, await atree_version()))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            response.headers.setdefault('ETag', etag)
+        return response
+    return inner
+
+
+@tree_condition
+async def search_categories(request):
+    query = request.GET.get('q', '')
+    exclude_id = request.GET.get('exclude', '')
+
+    if query.strip() and search_backend() == 'memory':
+        rows = await sync_to_async(autocomplete_categories)(
+            query, exclude_id=int(exclude_id) if exclude_id.isdigit() else None,
+        )
+        return JsonResponse({'results': [search_result(*row) for row in rows]})
+
+    exclude_category = None
+    if exclude_id:
+        try:
+            exclude_category = await Category.objects.aget(id=exclude_id)
+        except Category.DoesNotExist:
+            pass
+
+    categories = await sync_to_async(search_categories_queryset)(query, exclude_category)
+    results = [search_result(*row) async for row in categories.values_list('id', 'name', 'path')[:100]]
+
+    return JsonResponse({'results': results})
+
+
+@tree_condition
+async def category_tree(request):
+    """Async ``api.category_tree``."""
+    parent_id = request.GET.get('id', '')
+    if parent_id == '#':
+        parent_id = ''
+    depth = tree_depth(request)
+
+    if not parent_id:
+        categories = Category.objects.filter(level__lt=depth)
+        top_level = 0
+    elif depth == 1:
+        categories = Category.objects.filter(parent__id=parent_id)
+        top_level = None
+    else:
+        parent = await aget_object_or_404(Category.objects.only('tree_id', 'lft', 'rght', 'level'), id=parent_id)
+        categories = subtree_categories(parent, depth)
+        top_level = parent.level + 1
+
+    rows = [row async for row in tree_rows(categories)]
+    return JsonResponse(nest_tree_rows(rows, top_level, depth), safe=False)
+
+
+async def category_attributes(request, pk):
+    category = await aget_object_or_404(Category.objects.only('id'), pk=pk)
+
+    attr_page = int(request.GET.get('assigned_page', 1))
+    avail_page = int(request.GET.get('available_page', 1))
+    attr_per_page = int(request.GET.get('assigned_per_page', 10))
+    avail_per_page = int(request.GET.get('available_per_page', 10))
+
+    attr_search = request.GET.get('assigned_search', '').strip()
+    avail_search = request.GET.get('available_search', '').strip()
+
+    attributes_qs, available_qs = await sync_to_async(category_attribute_querysets)(
+        category.pk, attr_search, avail_search,
+    )
+
+    if request.GET.get('paginate') == 'keyset':
+        payload = await sync_to_async(keyset_payload)(
+            request, attributes_qs, available_qs, attr_per_page, avail_per_page,
+        )
+        return JsonResponse(payload)
+
+    attributes_paginator, attributes_page = await aget_page(attributes_qs, attr_page, attr_per_page)
+    available_paginator, available_page = await aget_page(available_qs, avail_page, avail_per_page)
+
+    return JsonResponse({
+        'attributes': [assigned_attribute(row) for row in attributes_page],
+        'attributes_page': attributes_page.number,
+        'attributes_num_pages': attributes_paginator.num_pages,
+        'attributes_count': attributes_paginator.count,
+        'attributes_per_page': attr_per_page,
+
+        'available_attributes': list(available_page),
+        'available_attributes_page': available_page.number,
+        'available_attributes_num_pages': available_paginator.num_pages,
+        'available_attributes_count': available_paginator.count,
+        'available_attributes_per_page': avail_per_page,
+    })
+
+
+async def search_attributes(request):
+    """Search attributes by category name."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Category name query is required'}, status=400)
+
+    category_id = await sync_to_async(category_id_for_path)(query)
+    results = []
+    if category_id:
+        results = [
+            {'id': attr_id, 'name': name}
+            async for attr_id, name in Attribute.objects.filter(categories__id=category_id).values_list('id', 'name')
+        ]
+
+    return JsonResponse({'success': True, 'attributes': results})
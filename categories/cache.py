@@ -0,0 +1,79 @@
+"""Versioned caching of category tree data.
+
+Every write to categories, attributes or their assignments bumps a version
+number stored in Django's cache once the transaction commits. Cached payloads
+are keyed by that version, so a bump invalidates all of them at once, and the
+version doubles as the ETag clients revalidate against. The cache must be
+shared by every process (the project uses the database cache), otherwise a
+bump made by an import command never reaches the web workers.
+"""
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Category
+
+VERSION_KEY = 'categories:tree-version'
+SNAPSHOT_KEY = 'categories:tree-snapshot:{version}'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def tree_version():
+    """Return the current tree version, initialising it if the cache lost it."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a reset never reuses an earlier version
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def atree_version():
+    """Async ``tree_version``, for views running on the event loop."""
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_tree_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_tree():
+    """Invalidate cached tree data once the current transaction commits.
+
+    Bumping on commit keeps readers from caching uncommitted state under the
+    new version.
+    """
+    transaction.on_commit(bump_tree_version)
+
+
+def build_tree_snapshot():
+    """Serialize the whole hierarchy in tree order."""
+    return list(
+        Category.objects.annotate(attribute_count=Count('attributes'))
+        .values('id', 'name', 'path', 'parent_id', 'level', 'attribute_count')
+        .order_by('tree_id', 'lft')
+    )
+
+
+def tree_snapshot_json(version):
+    """Return the JSON snapshot for ``version``, building it on a cache miss."""
+    key = SNAPSHOT_KEY.format(version=version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = json.dumps(
+            {'version': version, 'categories': build_tree_snapshot()},
+            cls=DjangoJSONEncoder,
+        )
+        cache.set(key, payload, timeout=SNAPSHOT_TIMEOUT)
+    return payload
@@ -0,0 +1,105 @@
+"""Streaming export of the category → attribute mapping.
+
+Rows are read in tree order with ``.iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, and are serialized chunk by chunk, so memory
+use does not depend on the number of assignments. ``export_chunks`` hands the
+same chunks to an ASGI response one at a time.
+"""
+import csv
+import io
+import json
+import os
+from itertools import groupby
+
+from asgiref.sync import sync_to_async
+
+from .propagation import through_model
+
+CHUNK_SIZE = 5000
+# Header of the per-category files written by extract_category_and_attribute.py
+ATTRIBUTE_COLUMN = 'Attribute Keys'
+
+
+def iter_assignments(chunk_size=CHUNK_SIZE):
+    """Yield ``(category id, category path, attribute name)`` in tree order."""
+    return through_model().objects.order_by(
+        'category__tree_id', 'category__lft', 'attribute__name',
+    ).values_list('category_id', 'category__path', 'attribute__name').iterator(chunk_size=chunk_size)
+
+
+def iter_categories(chunk_size=CHUNK_SIZE):
+    """Yield ``(category id, category path, [attribute names])`` in tree order."""
+    for (category_id, path), rows in groupby(iter_assignments(chunk_size), key=lambda row: row[:2]):
+        yield category_id, path, [name for _, _, name in rows]
+
+
+def csv_chunks(chunk_size=CHUNK_SIZE):
+    """CSV text with a ``category_path,attribute`` header, one assignment per row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['category_path', 'attribute'])
+    for index, (_, path, name) in enumerate(iter_assignments(chunk_size), start=1):
+        writer.writerow([path, name])
+        if index % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(chunk_size=CHUNK_SIZE):
+    """One JSON object per category: ``{"id", "path", "attributes"}``.
+
+    A chunk is cut after about ``chunk_size`` assignments, however they are
+    spread over categories.
+    """
+    lines = []
+    rows = 0
+    for category_id, path, names in iter_categories(chunk_size):
+        lines.append(json.dumps({'id': category_id, 'path': path, 'attributes': names}) + '\n')
+        rows += len(names)
+        if rows >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+            rows = 0
+    yield ''.join(lines)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'jsonl': ('application/x-ndjson', jsonl_chunks),
+}
+
+
+async def export_chunks(export_format, chunk_size=CHUNK_SIZE):
+    """Async iterator over the chunks of ``export_format``, for responses served under ASGI.
+
+    Django reads a sync iterator given to ``StreamingHttpResponse`` under
+    ASGI into memory in full before sending it. Here every chunk is read and
+    serialized in the request's database thread and sent before the next.
+    """
+    _, chunks = EXPORT_FORMATS[export_format]
+    # The generator keeps its cursor open, so it must stay on one thread
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    iterator = chunks(chunk_size)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
+
+
+def write_category_files(output_dir, chunk_size=CHUNK_SIZE):
+    """Write one ``<path>.csv`` per category, the layout import_category_attribute reads.
+
+    Returns ``(files, assignments)`` written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = assignments = 0
+    for _, path, names in iter_categories(chunk_size):
+        # A path separator in a category name cannot be part of a filename
+        filename = f"{path.replace(os.sep, '-')}.csv"
+        with open(os.path.join(output_dir, filename), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow([ATTRIBUTE_COLUMN])
+            writer.writerows([name] for name in names)
+        files += 1
+        assignments += len(names)
+    return files, assignments
@@ -0,0 +1,103 @@
+"""Resolution of feed product_type strings to the attributes of their category.
+
+Answers are kept in a per-process LRU keyed by category path. The whole LRU
+is dropped when the tree version changes, so a lookup costs one cache read of
+the version on a hit, and misses of a batch are loaded with a single query.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import tree_version
+from .models import Category
+from .parsing import product_type_paths
+
+DEFAULT_CACHE_SIZE = 10000
+# Cached for product types that match no category
+MISSING = None
+
+
+class FacetCache:
+    """Thread-safe LRU keyed by category path, cleared when the tree version changes.
+
+    Used for ``{path: (category id, attribute names) or MISSING}`` here and
+    for path → id lookups in ``paths``.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, paths, version):
+        """Return ``(hits, misses)`` for ``paths`` under ``version``."""
+        hits, misses = {}, []
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            for path in paths:
+                if path in self.entries:
+                    self.entries.move_to_end(path)
+                    hits[path] = self.entries[path]
+                else:
+                    misses.append(path)
+        return hits, misses
+
+    def store(self, values, version):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries.update(values)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+_cache = FacetCache(getattr(settings, 'CATEGORY_FACET_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def load_facets(paths):
+    """Read ``{path: (category id, sorted attribute names)}`` for existing paths in one query."""
+    found = {}
+    rows = Category.objects.filter(path__in=paths).order_by().values_list('path', 'id', 'attributes__name')
+    for path, category_id, name in rows:
+        _, names = found.setdefault(path, (category_id, []))
+        if name is not None:
+            names.append(name)
+    return {path: (category_id, tuple(sorted(names))) for path, (category_id, names) in found.items()}
+
+
+def resolve_paths(paths):
+    """Return ``{path: (category id, attribute names) or MISSING}`` for ``paths``."""
+    version = tree_version()
+    hits, misses = _cache.lookup(paths, version)
+    if misses:
+        loaded = load_facets(misses)
+        values = {path: loaded.get(path, MISSING) for path in misses}
+        _cache.store(values, version)
+        hits.update(values)
+    return hits
+
+
+def resolve_product_types(product_types):
+    """Resolve feed product_type strings ("A > B > C") to their category's attributes.
+
+    Returns one dict per input, in order, with the matched ``path`` and
+    ``category_id`` (``None`` when no category matches) and ``attributes``.
+    """
+    candidates = {product_type: product_type_paths(product_type) for product_type in product_types}
+    resolved = resolve_paths(list({path for paths in candidates.values() for path in paths}))
+
+    results = []
+    for product_type in product_types:
+        match = next((path for path in candidates[product_type] if resolved[path] is not MISSING), None)
+        category_id, attributes = resolved[match] if match else (None, ())
+        results.append({
+            'product_type': product_type,
+            'path': match,
+            'category_id': category_id,
+            'attributes': list(attributes),
+        })
+    return results
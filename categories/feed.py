@@ -0,0 +1,157 @@
+"""Extraction of category → attribute keys from the vendor product feed.
+
+The feed is a CSV with a ``product_type`` column ("A > B > C") and a
+``filterable_attributes`` column ("key:value,key:value"). Every N-level
+prefix of a product type collects the keys of all its products. This module
+does not import Django, so it is shared by ``extract_category_and_attribute.py``
+and the ``ingest_feed`` management command, and runs in worker processes.
+"""
+import io
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 100000  # Adjust based on your available memory
+
+PRODUCT_TYPE = "product_type"
+FILTERABLE_ATTRIBUTES = "filterable_attributes"
+
+
+def category_prefixes(product_type_full):
+    """Return every N-level category path ("A", "A > B", ...) of a product_type."""
+    parts = [part.strip() for part in product_type_full.split(">")]
+    return [" > ".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def extract_chunk(chunk):
+    """Return {category path: set of attribute keys} for one chunk of the feed.
+
+    Splitting and stripping run as pandas string operations over whole
+    columns; Python only loops over the distinct product types in the chunk.
+    Every prefix of every product type is registered, even when its rows
+    carry no ``key:value`` entry.
+    """
+    chunk = chunk.dropna(subset=[PRODUCT_TYPE, FILTERABLE_ATTRIBUTES])
+
+    # Extract keys from attributes, one row per "key:value" entry
+    attributes = chunk[FILTERABLE_ATTRIBUTES].str.split(",").explode()
+    attributes = attributes[attributes.str.contains(":", regex=False, na=False)]
+    pairs = pd.DataFrame({
+        PRODUCT_TYPE: chunk[PRODUCT_TYPE].loc[attributes.index].to_numpy(),
+        "key": attributes.str.split(":", n=1).str[0].str.strip().to_numpy(),
+    }).drop_duplicates()
+    keys_by_product_type = {
+        product_type_full: set(keys)
+        for product_type_full, keys in pairs.groupby(PRODUCT_TYPE, sort=False)["key"]
+    }
+
+    # Create N-level categories
+    keys_by_category = defaultdict(set)
+    for product_type_full in chunk[PRODUCT_TYPE].unique():
+        key_set = keys_by_product_type.get(product_type_full, set())
+        for category_path in category_prefixes(product_type_full):
+            keys_by_category[category_path].update(key_set)
+    return keys_by_category
+
+
+def merge_keys(product_type_keys, partial):
+    """Fold one partial {category path: keys} result into the running total."""
+    for category_path, keys in partial.items():
+        product_type_keys[category_path].update(keys)
+    return product_type_keys
+
+
+def read_chunks(input_csv, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield ({category path: keys}, rows read) for each chunk of the feed."""
+    with pd.read_csv(
+        input_csv,
+        usecols=[PRODUCT_TYPE, FILTERABLE_ATTRIBUTES],
+        dtype=str,
+        chunksize=chunksize,
+    ) as reader:
+        for chunk in reader:
+            yield extract_chunk(chunk), len(chunk)
+
+
+class ByteRangeReader(io.RawIOBase):
+    """Read-only view of the bytes ``[start, end)`` of a file."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def byte_ranges(input_csv, parts):
+    """Split the data lines of the feed into about ``parts`` ranges.
+
+    Every range starts right after a newline, so each one can be parsed on its
+    own. This assumes one record per line, i.e. no quoted embedded newlines.
+    """
+    size = os.path.getsize(input_csv)
+    with open(input_csv, "rb") as f:
+        f.readline()  # header
+        boundaries = [f.tell()]
+        step = max(1, (size - boundaries[0]) // parts)
+        for index in range(1, parts):
+            f.seek(boundaries[0] + index * step)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def extract_range(input_csv, columns, start, end, chunksize):
+    """Worker: extract one byte range and return ({category path: keys}, rows read)."""
+    product_type_keys = defaultdict(set)
+    rows = 0
+    with io.BufferedReader(ByteRangeReader(input_csv, start, end)) as stream:
+        with pd.read_csv(
+            stream,
+            header=None,
+            names=columns,
+            usecols=[PRODUCT_TYPE, FILTERABLE_ATTRIBUTES],
+            dtype=str,
+            chunksize=chunksize,
+        ) as reader:
+            for chunk in reader:
+                rows += len(chunk)
+                merge_keys(product_type_keys, extract_chunk(chunk))
+    return dict(product_type_keys), rows
+
+
+def read_ranges(input_csv, workers, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield ({category path: keys}, rows read) per byte range, as workers finish."""
+    columns = list(pd.read_csv(input_csv, nrows=0).columns)
+    # A few ranges per worker keeps the pool busy when ranges differ in cost
+    ranges = byte_ranges(input_csv, workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(extract_range, input_csv, columns, start, end, chunksize)
+            for start, end in ranges
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,178 @@
+"""Set-based loading of category → attribute-name mappings.
+
+The loader works on an in-memory mapping of category path components to the
+attribute names found for that category. Categories are resolved and created
+level by level, attributes and through rows are written with ``bulk_create``
+in sized batches, and the MPTT fields are rebuilt once at the end.
+"""
+import hashlib
+
+from django.db import transaction
+
+from .cache import invalidate_tree
+from .models import Attribute, Category, ImportFingerprint
+from .parsing import category_path_string
+from .paths import PathResolver
+from .propagation import BATCH_SIZE, assign_with_ancestors, bulk_unassign, through_model
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resolve_categories(paths, batch_size=BATCH_SIZE):
+    """Return ``({path components: category id}, created)`` for every prefix of ``paths``.
+
+    See ``PathResolver.resolve``.
+    """
+    return PathResolver().resolve(paths, batch_size)
+
+
+def resolve_attributes(names, batch_size=BATCH_SIZE):
+    """Return ``({name: attribute id}, created)``, inserting missing attributes in bulk."""
+    names = set(names)
+    ids_by_name = {}
+    for chunk in _chunks(names, batch_size):
+        ids_by_name.update(Attribute.objects.filter(name__in=chunk).values_list('name', 'id'))
+
+    missing = sorted(names - ids_by_name.keys())
+    if missing:
+        Attribute.objects.bulk_create(
+            [Attribute(name=name) for name in missing],
+            ignore_conflicts=True,
+            batch_size=batch_size,
+        )
+        invalidate_tree()
+        for chunk in _chunks(missing, batch_size):
+            ids_by_name.update(Attribute.objects.filter(name__in=chunk).values_list('name', 'id'))
+    return ids_by_name, len(missing)
+
+
+def load_category_attributes(mapping, batch_size=BATCH_SIZE):
+    """Write ``{path components: attribute names}`` to the database.
+
+    Each category receives its attributes and, like
+    ``Category.synchronize_attributes_with_ancestors``, so do all of its
+    ancestors. Everything runs in one transaction; returns a stats dict.
+    """
+    with transaction.atomic():
+        category_ids, categories_created = resolve_categories(mapping.keys(), batch_size)
+        attribute_ids, attributes_created = resolve_attributes(
+            set().union(*mapping.values()) if mapping else set(),
+            batch_size,
+        )
+        pairs = {
+            (category_ids[tuple(components)], attribute_ids[name])
+            for components, names in mapping.items()
+            for name in names
+        }
+        assign_with_ancestors(pairs, batch_size=batch_size)
+
+    return {
+        'categories': len(mapping),
+        'categories_created': categories_created,
+        'attributes_created': attributes_created,
+        'assignments': len(pairs),
+    }
+
+
+def attribute_set_digest(names):
+    """Stable SHA-256 of a set of attribute names."""
+    return hashlib.sha256('\n'.join(sorted(names)).encode('utf-8')).hexdigest()
+
+
+def load_changed_category_attributes(mapping, batch_size=BATCH_SIZE):
+    """Incremental variant of ``load_category_attributes``.
+
+    A digest of every category's attribute set is compared with the one stored
+    by the previous incremental import, and categories whose digest is
+    unchanged and whose path still exists are skipped without touching the
+    database further. A path deleted or renamed since is imported again. For
+    changed categories only the difference is applied: new attributes are
+    added (with ancestors), and attributes the previous import listed but
+    this one does not are removed from the category. Assignments made by hand
+    or by propagation are left alone. Fingerprints are stored in the same
+    transaction.
+    """
+    digests = {
+        category_path_string(components): (components, attribute_set_digest(names))
+        for components, names in mapping.items()
+    }
+    stored = {}
+    existing_paths = set()
+    for chunk in _chunks(digests, batch_size):
+        stored.update(
+            (path, (digest, set(names)))
+            for path, digest, names in ImportFingerprint.objects.filter(path__in=chunk).values_list(
+                'path', 'digest', 'attributes',
+            )
+        )
+        existing_paths.update(Category.objects.filter(path__in=chunk).values_list('path', flat=True))
+
+    changed = {
+        components: mapping[components]
+        for path, (components, digest) in digests.items()
+        if path not in stored or stored[path][0] != digest or path not in existing_paths
+    }
+    stats = {
+        'categories': len(mapping),
+        'categories_unchanged': len(mapping) - len(changed),
+        'categories_created': 0,
+        'attributes_created': 0,
+        'assignments_added': 0,
+        'assignments_removed': 0,
+    }
+    if not changed:
+        return stats
+
+    Through = through_model()
+    with transaction.atomic():
+        category_ids, stats['categories_created'] = resolve_categories(changed.keys(), batch_size)
+        attribute_ids, stats['attributes_created'] = resolve_attributes(set().union(*changed.values()), batch_size)
+
+        wanted = {
+            (category_ids[components], attribute_ids[name])
+            for components, names in changed.items()
+            for name in names
+        }
+        current = set()
+        for chunk in _chunks({category_ids[components] for components in changed}, batch_size):
+            current.update(
+                Through.objects.filter(category_id__in=chunk).values_list('category_id', 'attribute_id')
+            )
+
+        # Names the previous import listed for a category and this one does not
+        dropped = {}
+        for components, names in changed.items():
+            path = category_path_string(components)
+            if path in stored:
+                dropped[category_ids[components]] = stored[path][1] - names
+        dropped_ids = {}
+        for chunk in _chunks(set().union(*dropped.values()) if dropped else (), batch_size):
+            dropped_ids.update(Attribute.objects.filter(name__in=chunk).values_list('name', 'id'))
+        for category_id, names in dropped.items():
+            stale = [
+                dropped_ids[name] for name in names
+                if name in dropped_ids and (category_id, dropped_ids[name]) in current
+            ]
+            if stale:
+                stats['assignments_removed'] += bulk_unassign([category_id], stale)
+
+        added = wanted - current
+        assign_with_ancestors(added, batch_size=batch_size)
+        stats['assignments_added'] = len(added)
+
+        ImportFingerprint.objects.bulk_create(
+            [
+                ImportFingerprint(path=path, digest=digest, attributes=sorted(mapping[components]))
+                for path, (components, digest) in digests.items()
+                if components in changed
+            ],
+            update_conflicts=True,
+            unique_fields=['path'],
+            update_fields=['digest', 'attributes', 'updated_at'],
+            batch_size=batch_size,
+        )
+    return stats
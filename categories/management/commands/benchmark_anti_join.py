@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.models import Attribute, Category
+from categories.propagation import (
+    BATCH_SIZE, attributes_not_assigned, categories_without_attribute, through_model,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the "available attributes/categories" queries against a synthetic '
+        'assignment table. All generated data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=2000, help='Number of categories to generate')
+        parser.add_argument('--attributes', type=int, default=5000, help='Number of attributes to generate')
+        parser.add_argument('--assignments', type=int, default=1000000,
+                            help='Number of category/attribute assignments to generate')
+        parser.add_argument('--samples', type=int, default=20, help='Queries to time per variant')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            categories, attributes = self.generate(rng, options)
+            self.stdout.write(f"Generated {len(categories)} categories, {len(attributes)} attributes, "
+                              f"{options['assignments']} assignments")
+
+            sample_categories = rng.sample(categories, min(options['samples'], len(categories)))
+            sample_attributes = rng.sample(attributes, min(options['samples'], len(attributes)))
+            self.compare(
+                'available attributes',
+                sample_categories,
+                lambda pk: Attribute.objects.exclude(categories__id=pk),
+                attributes_not_assigned,
+            )
+            self.compare(
+                'available categories',
+                sample_attributes,
+                lambda pk: Category.objects.exclude(
+                    id__in=Attribute.objects.get(pk=pk).categories.values_list('id', flat=True)
+                ),
+                categories_without_attribute,
+            )
+            transaction.set_rollback(True)
+
+    def generate(self, rng, options):
+        categories = Category.objects.bulk_create(
+            [
+                Category(name=f'benchmark-{index}', path=f'benchmark-{index}',
+                         lft=1, rght=2, tree_id=index + 1, level=0)
+                for index in range(options['categories'])
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        attributes = Attribute.objects.bulk_create(
+            [Attribute(name=f'benchmark-{index}') for index in range(options['attributes'])],
+            batch_size=BATCH_SIZE,
+        )
+        category_ids = [category.pk for category in categories]
+        attribute_ids = [attribute.pk for attribute in attributes]
+        wanted = min(options['assignments'], len(category_ids) * len(attribute_ids))
+
+        Through = through_model()
+        pairs = set()
+        while len(pairs) < wanted:
+            batch = []
+            while len(batch) < BATCH_SIZE * 10 and len(pairs) < wanted:
+                pair = (rng.choice(category_ids), rng.choice(attribute_ids))
+                if pair not in pairs:
+                    pairs.add(pair)
+                    batch.append(Through(category_id=pair[0], attribute_id=pair[1]))
+            Through.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        return category_ids, attribute_ids
+
+    def compare(self, label, sample_ids, old_query, new_query):
+        for name, query in (('exclude', old_query), ('not exists', new_query)):
+            timings = []
+            for pk in sample_ids:
+                start = time.perf_counter()
+                queryset = query(pk)
+                queryset.count()
+                list(queryset.order_by('name', 'id')[:10])
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{label:22} {name:11} median {statistics.median(timings) * 1000:8.2f} ms  "
+                f"max {max(timings) * 1000:8.2f} ms"
+            )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from categories.models import Category
+from categories.tree import CategoryTree
+
+
+class Command(BaseCommand):
+    help = 'Checks the MPTT fields of every category for consistency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild the MPTT fields if problems are found')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        tree = CategoryTree.load()
+        problems = tree.validate()
+        elapsed = time.monotonic() - started
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(f"Checked {len(tree)} categories in {elapsed:.2f}s, no problems"))
+            return
+
+        for problem in problems:
+            self.stderr.write(problem)
+        self.stderr.write(self.style.ERROR(f"{len(problems)} problems in {len(tree)} categories"))
+        if options['rebuild']:
+            Category.objects.rebuild()
+            remaining = CategoryTree.load().validate()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the tree, {len(remaining)} problems remain"))
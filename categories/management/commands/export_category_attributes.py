@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from categories.export import CHUNK_SIZE, EXPORT_FORMATS, write_category_files
+
+
+class Command(BaseCommand):
+    help = 'Exports every category/attribute assignment as CSV, JSONL or a directory of per-category CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=[*EXPORT_FORMATS, 'directory'], default='csv',
+            help="'csv' (category_path,attribute rows), 'jsonl' (one object per category) or "
+                 "'directory' (one file per category, the layout import_category_attribute reads)",
+        )
+        parser.add_argument(
+            '--output', type=str,
+            help='Output file, or directory for --format directory. Defaults to stdout for csv/jsonl',
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        output = options['output']
+        started = time.monotonic()
+
+        if export_format == 'directory':
+            if not output:
+                raise CommandError('--output is required for --format directory')
+            files, assignments = write_category_files(output, options['chunk_size'])
+            self.stderr.write(self.style.SUCCESS(
+                f"Wrote {assignments} assignments to {files} files in {time.monotonic() - started:.2f}s"
+            ))
+            return
+
+        _, chunks = EXPORT_FORMATS[export_format]
+        stream = open(output, 'w', newline='') if output else sys.stdout
+        try:
+            for chunk in chunks(options['chunk_size']):
+                stream.write(chunk)
+        finally:
+            if output:
+                stream.close()
+        if output:
+            self.stderr.write(self.style.SUCCESS(
+                f"Exported to {output} in {time.monotonic() - started:.2f}s"
+            ))
@@ -1,15 +1,39 @@
 import os
 import csv
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from mptt.models import MPTTModel, TreeForeignKey
 from categories.models import Category, Attribute
+from categories.importing import load_category_attributes, load_changed_category_attributes
+from categories.parsing import parse_category_path, read_category_file
+from categories.paths import PathResolver
+from categories.propagation import BATCH_SIZE
 
 class Command(BaseCommand):
     help = 'Imports category attributes from CSV files in a directory'
 
     def add_arguments(self, parser):
         parser.add_argument('directory', type=str, help='Directory containing the CSV files')
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Read every file first, then write categories, attributes and assignments with bulk inserts',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Rows per INSERT statement in bulk mode',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Parse files in this many processes (implies --bulk)',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Skip categories whose attribute set is unchanged since the last incremental import '
+                 'and apply only additions/removals for the rest (implies --bulk)',
+        )
 
     def handle(self, *args, **options):
         directory = options['directory']
@@ -18,7 +42,10 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"Directory '{directory}' does not exist"))
             return
 
-        self.process_files(directory)
+        if options['bulk'] or options['workers'] > 1 or options['incremental']:
+            self.process_files_bulk(directory, options['batch_size'], options['workers'], options['incremental'])
+        else:
+            self.process_files(directory)
 
     def process_files(self, directory):
         csv_files = [f for f in os.listdir(directory) if f.endswith('.csv')]
@@ -27,10 +54,55 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("No CSV files found in directory"))
             return
 
+        self.path_resolver = PathResolver()
         with transaction.atomic():
             for filename in csv_files:
                 self.process_file(os.path.join(directory, filename))
 
+    def process_files_bulk(self, directory, batch_size, workers=1, incremental=False):
+        csv_files = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+
+        if not csv_files:
+            self.stdout.write(self.style.WARNING("No CSV files found in directory"))
+            return
+
+        started = time.monotonic()
+        mapping = defaultdict(set)
+        rows = 0
+        for filename, parsed, error in self.read_files(directory, csv_files, workers):
+            if error:
+                self.stderr.write(self.style.ERROR(f"Skipping {filename}: {error}"))
+                continue
+            components, names, row_count = parsed
+            mapping[components].update(names)
+            rows += row_count
+        parsed_at = time.monotonic()
+        self.stdout.write(f"Parsed {len(csv_files)} files in {parsed_at - started:.2f}s")
+
+        loader = load_changed_category_attributes if incremental else load_category_attributes
+        stats = loader(mapping, batch_size=batch_size)
+        self.report(stats, rows, len(csv_files), time.monotonic() - started)
+
+    def read_files(self, directory, csv_files, workers):
+        """Yield ``(filename, parsed, error)`` for every file, in a process pool if requested."""
+        filepaths = [os.path.join(directory, filename) for filename in csv_files]
+        if workers <= 1:
+            yield from map(read_category_file, filepaths)
+            return
+
+        chunksize = max(1, len(filepaths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(read_category_file, filepaths, chunksize=chunksize)
+
+    def report(self, stats, rows, file_count, elapsed):
+        rate = rows / elapsed if elapsed > 0 else float(rows)
+        self.stdout.write(", ".join(
+            f"{key.replace('_', ' ').capitalize()}: {value}" for key, value in stats.items()
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {rows} rows from {file_count} files in {elapsed:.2f}s ({rate:.0f} rows/sec)"
+        ))
+
     def process_file(self, filepath):
         filename = os.path.basename(filepath)
         self.stdout.write(f"Processing file: {filename}")
@@ -75,46 +147,11 @@ class Command(BaseCommand):
 
     def parse_category_path(self, filename):
         """Convert filename to category path"""
-        if not filename.endswith('.csv'):
-            raise ValueError("File is not a CSV")
-        
-        # Remove .csv extension
-        base_name = filename[:-4]
-        
-        base_name = base_name.replace('___', '###')
-        
-        path_components = base_name.split('__')
-        
-        if not path_components:
-            raise ValueError("Filename doesn't contain valid category path")
-        
-        return [comp.replace('_', ' ').replace('###', '___') for comp in path_components]
+        return parse_category_path(filename)
 
     def get_or_create_categories(self, path_components):
         """Get or create categories in the path, return the leaf category"""
-        parent = None
-        current_path = []
-        
-        for component in path_components:
-            current_path.append(component)
-            path_str = '__'.join(current_path)
-            path_str = path_str.replace(' ', '_')
-            
-            category = Category.objects.filter(name=component).first()
-            
-            if not category:
-                category = Category(
-                    name=component,
-                    parent=parent,
-                    path=path_str
-                )
-                category.save()
-                self.stdout.write(f"Created category: {path_str}")
-            else:
-                if category.path != path_str:
-                    category.path = path_str
-                    category.save()
-            
-            parent = category
-        
-        return category
\ No newline at end of file
+        category_id, created = self.path_resolver.get_or_create(path_components)
+        for path_str in created:
+            self.stdout.write(f"Created category: {path_str}")
+        return Category.objects.get(pk=category_id)
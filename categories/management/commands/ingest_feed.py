@@ -0,0 +1,77 @@
+import os
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from categories.feed import DEFAULT_CHUNKSIZE, merge_keys, read_chunks, read_ranges
+from categories.importing import load_category_attributes
+from categories.propagation import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Streams the vendor product feed straight into the category and attribute tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('feed', type=str, help='Vendor feed CSV file')
+        parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Feed rows read per chunk')
+        parser.add_argument(
+            '--flush-rows', type=int, default=1000000,
+            help='Write accumulated categories to the database every this many feed rows',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per INSERT statement')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Extract byte ranges of the feed in this many processes (requires one record per line)',
+        )
+
+    def handle(self, *args, **options):
+        feed = options['feed']
+
+        if not os.path.isfile(feed):
+            self.stderr.write(self.style.ERROR(f"Feed '{feed}' does not exist"))
+            return
+
+        if options['workers'] > 1:
+            partials = read_ranges(feed, options['workers'], options['chunksize'])
+        else:
+            partials = read_chunks(feed, options['chunksize'])
+
+        started = time.monotonic()
+        totals = defaultdict(int)
+        pending = defaultdict(set)
+        pending_rows = 0
+        rows = 0
+        for partial, partial_rows in partials:
+            merge_keys(pending, partial)
+            pending_rows += partial_rows
+            rows += partial_rows
+            if pending_rows >= options['flush_rows']:
+                self.flush(pending, options['batch_size'], totals)
+                pending = defaultdict(set)
+                pending_rows = 0
+        if pending:
+            self.flush(pending, options['batch_size'], totals)
+
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed > 0 else float(rows)
+        self.stdout.write(
+            f"Categories created: {totals['categories_created']}, "
+            f"attributes created: {totals['attributes_created']}, "
+            f"assignment pairs applied: {totals['assignments']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {rows} feed rows in {elapsed:.2f}s ({rate:.0f} rows/sec)"
+        ))
+
+    def flush(self, pending, batch_size, totals):
+        """Apply one batch of {"A > B": keys} in its own transaction."""
+        mapping = {}
+        for category_path, keys in pending.items():
+            components = tuple(category_path.split(" > "))
+            if all(components):
+                # Categories without attribute keys are created too
+                mapping[components] = {key for key in keys if key}
+
+        stats = load_category_attributes(mapping, batch_size=batch_size)
+        for key in ('categories_created', 'attributes_created', 'assignments'):
+            totals[key] += stats[key]
+        self.stdout.write(f"Flushed {len(mapping)} categories ({stats['assignments']} assignments)")
@@ -0,0 +1,119 @@
+import asyncio
+import random
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from categories.models import Category
+
+ENDPOINTS = {
+    'sync': 'api_search_categories',
+    'async': 'async_search_categories',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires many simultaneous autocomplete requests at the sync and async category '
+        'search endpoints through the ASGI application, in process, and reports '
+        'throughput and latency for each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+        parser.add_argument('--prefix-length', type=int, default=3, help='Characters of a category name to query')
+        parser.add_argument('--endpoint', choices=[*ENDPOINTS, 'both'], default='both')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Category.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('There are no categories to search for')
+        rng = random.Random(options['seed'])
+        queries = [rng.choice(names)[:options['prefix_length']] for _ in range(options['requests'])]
+
+        application = get_asgi_application()
+        endpoints = ENDPOINTS if options['endpoint'] == 'both' else {options['endpoint']: ENDPOINTS[options['endpoint']]}
+        for label, url_name in endpoints.items():
+            path = reverse(url_name)
+            # One untimed request per endpoint warms search indexes and memos
+            asyncio.run(self.run(application, path, queries[:1], 1, options['host']))
+            elapsed, latencies, errors = asyncio.run(
+                self.run(application, path, queries, options['concurrency'], options['host'])
+            )
+            self.report(label, elapsed, latencies, errors)
+
+    async def run(self, application, path, queries, concurrency, host):
+        pending = asyncio.Queue()
+        for query in queries:
+            pending.put_nowait(query)
+        latencies = []
+        errors = []
+
+        async def worker():
+            while not pending.empty():
+                query = pending.get_nowait()
+                started = time.perf_counter()
+                status = await self.request(application, path, urlencode({'q': query}), host)
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors.append(status)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies, errors
+
+    async def request(self, application, path, query_string, host):
+        """Send one GET through ``application`` and return the response status."""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'headers': [(b'host', host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (host, 80),
+        }
+        received = False
+        disconnected = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Later calls wait for the client to go away, as a server would
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        try:
+            await application(scope, receive, send)
+        finally:
+            disconnected.set()
+        return status
+
+    def report(self, label, elapsed, latencies, errors):
+        latencies = sorted(latencies)
+        percentile = lambda fraction: latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+        self.stdout.write(
+            f"{label:>5}: {len(latencies)} requests in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:.0f} req/s), "
+            f"p50 {percentile(0.5):.1f}ms, p95 {percentile(0.95):.1f}ms, p99 {percentile(0.99):.1f}ms, "
+            f"mean {statistics.mean(latencies) * 1000:.1f}ms, errors {len(errors)}"
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from categories.models import EffectiveAttribute
+from categories.propagation import BATCH_SIZE, through_model
+
+
+class Command(BaseCommand):
+    help = 'Reconciles the effective-attribute table with the category/attribute assignments'
+
+    def handle(self, *args, **options):
+        Through = through_model()
+        with transaction.atomic():
+            orphaned, _ = EffectiveAttribute.objects.exclude(
+                Exists(Through.objects.filter(
+                    category_id=OuterRef('category_id'),
+                    attribute_id=OuterRef('attribute_id'),
+                ))
+            ).delete()
+
+            missing = Through.objects.exclude(
+                Exists(EffectiveAttribute.objects.filter(
+                    category_id=OuterRef('category_id'),
+                    attribute_id=OuterRef('attribute_id'),
+                ))
+            ).values_list('category_id', 'attribute_id')
+            created = EffectiveAttribute.objects.bulk_create(
+                [
+                    EffectiveAttribute(category_id=category_id, attribute_id=attribute_id, source_id=category_id)
+                    for category_id, attribute_id in missing.iterator(chunk_size=BATCH_SIZE)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {orphaned} orphaned and added {len(created)} missing effective attributes"
+        ))
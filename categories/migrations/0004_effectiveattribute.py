@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 16:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_effective_attributes(apps, schema_editor):
+    """Copy existing assignments; their origin is unknown, so they count as direct."""
+    Attribute = apps.get_model('categories', 'Attribute')
+    EffectiveAttribute = apps.get_model('categories', 'EffectiveAttribute')
+    through_table = Attribute.categories.through._meta.db_table
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(EffectiveAttribute._meta.db_table)} (category_id, attribute_id, source_id, inherited) "
+            f"SELECT category_id, attribute_id, category_id, %s FROM {qn(through_table)}",
+            [False],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_importfingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inherited', models.BooleanField(default=False)),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_assignments', to='categories.attribute')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_attributes', to='categories.category')),
+                ('source', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='categories.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['attribute', 'category'], name='categories__attribu_346b45_idx'), models.Index(fields=['source', 'attribute'], name='categories__source__65e6c7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='effectiveattribute',
+            constraint=models.UniqueConstraint(fields=('category', 'attribute'), name='unique_effective_attribute'),
+        ),
+        migrations.RunPython(backfill_effective_attributes, migrations.RunPython.noop),
+    ]
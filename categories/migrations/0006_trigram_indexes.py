@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# Django compiles icontains to UPPER(column::text) LIKE UPPER(...), which only
+# an expression index can serve; the plain column index serves the % operator
+# and similarity().
+TRIGRAM_INDEXES = [
+    ('categories_category_name_trgm', 'categories_category', 'name'),
+    ('categories_category_name_upper_trgm', 'categories_category', 'UPPER(name::text)'),
+    ('categories_category_path_trgm', 'categories_category', 'path'),
+    ('categories_category_path_upper_trgm', 'categories_category', 'UPPER(path::text)'),
+    ('categories_attribute_name_trgm', 'categories_attribute', 'name'),
+    ('categories_attribute_name_upper_trgm', 'categories_attribute', 'UPPER(name::text)'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm only exists on PostgreSQL; other backends search through the
+    # in-memory n-gram index in categories.search instead.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0004_effectiveattribute'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
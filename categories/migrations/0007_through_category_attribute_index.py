@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# The auto-created through table already has a unique (attribute_id,
+# category_id) index; this adds the reverse order so "attributes not on this
+# category" anti-joins probe a single index entry per attribute.
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS categories_attribute_categories_cat_attr_idx '
+    'ON categories_attribute_categories (category_id, attribute_id)'
+)
+DROP_INDEX = 'DROP INDEX IF EXISTS categories_attribute_categories_cat_attr_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0006_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
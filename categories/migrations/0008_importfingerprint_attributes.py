@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0007_through_category_attribute_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfingerprint',
+            name='attributes',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import connection, models, transaction
 from django.urls import reverse
-from django.db.models import Prefetch
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from mptt.models import MPTTModel, TreeForeignKey
 
 
@@ -22,11 +23,13 @@ class Category(MPTTModel):
 
     def save(self, *args, **kwargs):
         if not self.pk:
-            if self.parent:
-                self.path = f"{self.parent.path}__{self.name.replace(' ', '_')}"
-            else:
-                self.path = self.name.replace(' ', '_')
+            self.path = self.build_path()
         super().save(*args, **kwargs)
+
+    def build_path(self):
+        """Path from the parent's stored path and this category's name."""
+        name = self.name.replace(' ', '_')
+        return f"{self.parent.path}__{name}" if self.parent else name
     
     def __str__(self):
         return self.name
@@ -44,74 +47,104 @@ class Category(MPTTModel):
 
     def add_attribute(self, attribute):
         """Add attribute to this category and all ancestors"""
-        with transaction.atomic():
-            self.attributes.add(attribute)
-            
-            for ancestor in self.get_ancestors(include_self=False):
-                ancestor.attributes.add(attribute)
-
+        from .propagation import add_to_ancestors
+        add_to_ancestors(self, [attribute.pk])
 
     def remove_attribute(self, attribute):
-        """Remove attribute from this category and descendants where no other ancestor has it"""
+        """Remove attribute from this category and all descendants"""
+        from .propagation import remove_from_subtree
+        remove_from_subtree(self, [attribute.pk])
+
+    def set_attributes(self, attribute_ids):
+        """Replace this category's attributes, propagating additions up and down the tree"""
+        from .propagation import replace_attributes
+        return replace_attributes(self, attribute_ids)
+
+    def delete_subtree(self):
+        """Delete this category and all descendants in a fixed number of statements.
+
+        Through rows go with one filtered delete, the categories with one
+        DELETE over the MPTT range, and the tree gap is closed once. Returns
+        the number of categories and attribute assignments removed.
+        """
+        from .cache import invalidate_tree
+        from .propagation import descendants_queryset, through_model
+
         with transaction.atomic():
-            self.attributes.remove(attribute)
-            
-            for descendant in self.get_descendants(include_self=False):
-                descendant.attributes.remove(attribute)
+            # Use the database's MPTT values, as MPTTModel.delete does
+            self.refresh_from_db(fields=['lft', 'rght', 'tree_id'])
+            subtree_ids = descendants_queryset(self, include_self=True).values('id')
+
+            assignments, _ = through_model().objects.filter(category_id__in=subtree_ids).delete()
+            EffectiveAttribute.objects.filter(category_id__in=subtree_ids).delete()
+            EffectiveAttribute.objects.filter(source_id__in=subtree_ids).update(source=None)
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {connection.ops.quote_name(self._meta.db_table)} "
+                    "WHERE tree_id = %s AND lft >= %s AND rght <= %s",
+                    [self.tree_id, self.lft, self.rght],
+                )
+                categories = cursor.rowcount
+
+            Category._tree_manager._close_gap(self.rght - self.lft + 1, self.rght, self.tree_id)
+            invalidate_tree()
+
+        return {'categories': categories, 'assignments': assignments}
 
     def update_paths_for_subtree(self):
-        """Efficient path updates using PostgreSQL CTE for large datasets"""
-        if not connection.vendor == 'postgresql':
-            return self._fallback_update_paths()
-            
+        """Rewrite ``path`` for this category and all of its descendants.
+
+        The stored path of this category is replaced by ``build_path()`` as a
+        prefix of every path in the subtree with a single UPDATE bounded by the
+        MPTT range, so it runs the same on PostgreSQL and SQLite. Returns the
+        number of rows updated.
+        """
+        with transaction.atomic():
+            old_path = Category.objects.values_list('path', flat=True).get(pk=self.pk)
+            self.refresh_from_db(fields=['lft', 'rght', 'tree_id'])
+            new_path = self.build_path()
+            if new_path == old_path:
+                return 0
+
+            updated = Category.objects.filter(
+                tree_id=self.tree_id, lft__gte=self.lft, rght__lte=self.rght,
+            ).update(path=Concat(Value(new_path), Substr('path', len(old_path) + 1)))
+            self.path = new_path
+            return updated
+
+    def rename_and_move(self, name, parent):
+        """Rename and/or re-parent this category in one transaction.
+
+        MPTT moves the node with range updates, descendant paths are rewritten
+        by ``update_paths_for_subtree`` and, after a move, inherited rows cut
+        off from their source are detached and the subtree's attributes are
+        propagated to the new ancestors.
+        """
+        from .propagation import detach_moved_sources
+        parent_changed = (parent.pk if parent else None) != self.parent_id
         with transaction.atomic():
-            if self.parent:
-                self.path = f"{self.parent.path}__{self.name.replace(' ', '_')}"
-            else:
-                self.path = self.name.replace(' ', '_')
+            self.name = name
+            self.parent = parent
             self.save()
-
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    WITH RECURSIVE descendants AS (
-                        SELECT id, name, parent_id
-                        FROM categories_category
-                        WHERE id = %s
-                        
-                        UNION ALL
-                        
-                        SELECT c.id, c.name, c.parent_id
-                        FROM categories_category c
-                        JOIN descendants d ON c.parent_id = d.id
-                    )
-                    UPDATE categories_category cat
-                    SET path = 
-                        CASE 
-                            WHEN cat.parent_id IS NULL THEN cat.name
-                            ELSE CONCAT(
-                                (SELECT path FROM categories_category WHERE id = cat.parent_id),
-                                '__',
-                                REPLACE(cat.name, ' ', '_')
-                            )
-                        END
-                    FROM descendants d
-                    WHERE cat.id = d.id AND d.id != %s
-                """, [self.id, self.id])
+            self.update_paths_for_subtree()
+            if parent_changed:
+                detach_moved_sources(self)
+                self.synchronize_attributes_with_ancestors()
 
     def synchronize_attributes_with_ancestors(self):
         """Efficiently sync attributes from descendants to ancestors."""
+        from .propagation import ancestor_ids, descendants_queryset, through_model, write_assignments
         with transaction.atomic():
-            current_attrs = set(self.get_descendants(include_self=True).prefetch_related(
-                Prefetch('attributes', queryset=Attribute.objects.only('id'))
-            ).values_list('attributes__id', flat=True))
-
-            for ancestor in self.get_ancestors(include_self=False):
-                ancestor_attrs = set(a.id for a in ancestor.attributes.all())
-
-                missing_attrs = current_attrs - ancestor_attrs
-
-                if missing_attrs:
-                    ancestor.attributes.add(*Attribute.objects.filter(id__in=missing_attrs))
+            current_attrs = set(through_model().objects.filter(
+                category_id__in=descendants_queryset(self, include_self=True).values('id'),
+            ).values_list('attribute_id', flat=True).distinct())
+
+            write_assignments(
+                (ancestor_id, attribute_id, self.pk)
+                for ancestor_id in ancestor_ids(self, include_self=False)
+                for attribute_id in current_attrs
+            )
 
 
 class Attribute(models.Model):
@@ -127,27 +160,42 @@ class Attribute(models.Model):
     
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        for category in self.categories.all():
-            for descendant in category.get_descendants():
-                if self not in descendant.attributes.all():
-                    descendant.attributes.add(self)
-    
-    def delete(self, *args, **kwargs):
-        categories = list(self.categories.all())
-        super().delete(*args, **kwargs)
-        
-        for category in categories:
-            self._cleanup_after_deletion(category)
-    
-    def _cleanup_after_deletion(self, category):
-        for descendant in category.get_descendants():
-            has_ancestor_with_attribute = any(
-                self in ancestor.attributes.all()
-                for ancestor in descendant.get_ancestors(include_self=True)
-            )
-            if not has_ancestor_with_attribute:
-                Attribute.categories.through.objects.filter(
-                    attribute_id=self.id,
-                    category_id=descendant.id
-                ).delete()
+        from .propagation import push_down
+        push_down(self.pk)
+
+
+class EffectiveAttribute(models.Model):
+    """An attribute a category has, and the category it came from.
+
+    Mirrors the ``Attribute.categories`` through table row for row. ``source``
+    is the category the attribute was assigned to; rows copied there by
+    propagation to ancestors or descendants are marked ``inherited``. The
+    source is cleared when that category is deleted, since the copy stays.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='effective_attributes')
+    attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE, related_name='effective_assignments')
+    source = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    inherited = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'attribute'], name='unique_effective_attribute'),
+        ]
+        indexes = [
+            models.Index(fields=['attribute', 'category']),
+            models.Index(fields=['source', 'attribute']),
+        ]
 
+    def __str__(self):
+        return f"{self.category} / {self.attribute}"
+
+
+class ImportFingerprint(models.Model):
+    """Digest and names of the attribute set last imported for a category path."""
+    path = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+    attributes = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
@@ -0,0 +1,164 @@
+"""Keyset (cursor) pagination with approximate counts.
+
+``Paginator`` counts the whole list and skips ``OFFSET`` rows for every page,
+so deep pages of large lists get slower. A keyset page instead continues
+from the ordering key of the last row shown, ``WHERE (name, id) > (...)``,
+which an index on the ordering columns answers at the same cost on any page.
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+
+# Below this estimated size an exact COUNT(*) is cheap enough to run instead
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def encode_cursor(key, backwards=False):
+    payload = {'k': list(key), 'b': backwards}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(token, size):
+    """Return ``(key, backwards)`` for a cursor token, or ``(None, False)`` if it is invalid."""
+    if not token:
+        return None, False
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        key = tuple(payload['k'])
+        backwards = bool(payload.get('b'))
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None, False
+    if len(key) != size:
+        return None, False
+    return key, backwards
+
+
+def approximate_count(queryset):
+    """Number of rows in ``queryset``, estimated by the planner on PostgreSQL.
+
+    Small estimates are replaced by an exact count. Other backends always
+    count exactly. Returns ``(count, is_approximate)``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count(), False
+    return estimate, True
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    for part in field.split('__'):
+        row = getattr(row, part)
+    return row
+
+
+def _after(fields, key, backwards):
+    """``Q`` for rows strictly after (or before) ``key`` in ``fields`` order."""
+    lookup = 'lt' if backwards else 'gt'
+    return reduce(or_, (
+        Q(**{field: value for field, value in zip(fields[:index], key[:index])},
+          **{f'{fields[index]}__{lookup}': key[index]})
+        for index in range(len(fields))
+    ))
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, fields, per_page, has_next, has_previous, count, count_is_approximate):
+        self.object_list = object_list
+        self.fields = fields
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+        self.count_is_approximate = count_is_approximate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _key(self, row):
+        return [_row_value(row, field) for field in self.fields]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self._key(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        return encode_cursor(self._key(self.object_list[0]), backwards=True)
+
+
+def keyset_page(queryset, cursor=None, per_page=10, fields=('name', 'id'), count=True):
+    """Return the ``KeysetPage`` of ``queryset`` that ``cursor`` points at.
+
+    ``fields`` is the ordering key and must end in a unique column. Without a
+    valid cursor the first page is returned. The page reads ``per_page + 1``
+    rows to tell whether another page follows.
+    """
+    fields = list(fields)
+    key, backwards = decode_cursor(cursor, len(fields))
+
+    rows = queryset
+    if key is not None:
+        rows = rows.filter(_after(fields, key, backwards))
+    if backwards:
+        rows = rows.order_by(*[f'-{field}' for field in fields])
+    else:
+        rows = rows.order_by(*fields)
+    object_list = list(rows[:per_page + 1])
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if backwards:
+        object_list.reverse()
+
+    total, approximate = approximate_count(queryset) if count else (None, False)
+    return KeysetPage(
+        object_list,
+        fields,
+        per_page,
+        has_next=has_more if not backwards else key is not None,
+        has_previous=key is not None if not backwards else has_more,
+        count=total,
+        count_is_approximate=approximate,
+    )
+
+
+async def aget_page(queryset, number, per_page):
+    """Async ``Paginator(queryset, per_page).get_page(number)``.
+
+    Returns ``(paginator, page)`` with the page rows already fetched, so
+    neither touches the database afterwards.
+    """
+    paginator = Paginator(queryset, per_page)
+    # Seeding the cached count keeps get_page() from counting synchronously
+    paginator.count = await queryset.acount()
+    page = paginator.get_page(number)
+    page.object_list = [row async for row in page.object_list]
+    return paginator, page
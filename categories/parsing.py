@@ -0,0 +1,89 @@
+"""Parsing of the per-category CSV files produced by the feed extraction.
+
+Nothing here touches Django, so these functions can run in worker processes
+that have not set up the app registry.
+"""
+import csv
+import os
+import re
+
+
+def parse_category_path(filename):
+    """Convert filename to category path"""
+    if not filename.endswith('.csv'):
+        raise ValueError("File is not a CSV")
+
+    # Remove .csv extension
+    base_name = filename[:-4]
+
+    base_name = base_name.replace('___', '###')
+
+    path_components = base_name.split('__')
+
+    if not path_components:
+        raise ValueError("Filename doesn't contain valid category path")
+
+    return [comp.replace('_', ' ').replace('###', '___') for comp in path_components]
+
+
+def sanitize_filename(name):
+    # Replace special characters with underscores and trim excessive underscores
+    return re.sub(r'[^\w\-,.\&]','',name)
+
+
+def product_type_paths(product_type):
+    """Candidate ``Category.path`` values for a feed product_type ("A > B > C").
+
+    The first is the path the category gets when created by name; the second
+    the one it gets when imported from the files extract_category_and_attribute.py
+    writes, whose names went through ``sanitize_filename``.
+    """
+    components = [part.strip() for part in product_type.split('>')]
+    components = [part for part in components if part]
+    if not components:
+        return []
+    paths = [category_path_string(components)]
+    sanitized = sanitize_filename('__'.join(components))
+    if sanitized not in paths:
+        paths.append(sanitized)
+    return paths
+
+
+def category_path_string(components):
+    """Return the ``Category.path`` value for a list of path components."""
+    return '__'.join(components).replace(' ', '_')
+
+
+def parse_category_file(filepath):
+    """Read one category CSV file.
+
+    Returns ``(path components, attribute names, row count)``. Raises
+    ``ValueError`` when the filename is not a category path.
+    """
+    components = tuple(parse_category_path(os.path.basename(filepath)))
+    names = set()
+    rows = 0
+    with open(filepath, 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            attr_name = row[0].strip()
+            if attr_name:
+                names.add(attr_name)
+    return components, frozenset(names), rows
+
+
+def read_category_file(filepath):
+    """Parse one file for a worker pool.
+
+    Returns ``(filename, parsed, error)`` where exactly one of ``parsed`` and
+    ``error`` is set, so a bad file does not abort the whole pool.
+    """
+    filename = os.path.basename(filepath)
+    try:
+        return filename, parse_category_file(filepath), None
+    except (ValueError, OSError, UnicodeDecodeError, csv.Error) as e:
+        return filename, None, str(e)
@@ -0,0 +1,199 @@
+"""Resolution of category paths to ids.
+
+``PathResolver`` loads the name → (id, path) map of the whole table with one
+query and resolves many paths against it, creating missing prefixes with one
+``bulk_create`` per tree level. ``category_id_for_path`` keeps found ids in a
+process-wide LRU, dropped whenever the tree version changes.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Max
+
+from .cache import invalidate_tree, tree_version
+from .facets import DEFAULT_CACHE_SIZE, FacetCache
+from .models import Category
+from .parsing import category_path_string
+from .propagation import BATCH_SIZE
+
+
+class PathResolver:
+    """Resolve path components to category ids, querying the table once.
+
+    Category names are unique, so an existing category is matched by name and
+    its path is corrected if it differs, as the row-by-row importer always did.
+    """
+
+    def __init__(self):
+        self._existing = None
+
+    @property
+    def existing(self):
+        if self._existing is None:
+            self._existing = {
+                name: (category_id, path)
+                for category_id, name, path in Category.objects.values_list('id', 'name', 'path')
+            }
+        return self._existing
+
+    def resolve(self, paths, batch_size=BATCH_SIZE):
+        """Return ``({path components: id}, created)`` for every prefix of ``paths``.
+
+        Missing categories are inserted with one ``bulk_create`` per tree
+        level, into their parent's tree or a new one, and only the trees
+        that received categories are renumbered afterwards, so the MPTT
+        fields are sound whenever the caller's transaction commits.
+        """
+        existing = self.existing
+        prefixes_by_level = defaultdict(set)
+        for components in paths:
+            for depth in range(1, len(components) + 1):
+                prefixes_by_level[depth].add(tuple(components[:depth]))
+
+        resolved = {}
+        path_fixes = {}
+        created = 0
+        tree_ids = {}
+        next_tree_id = None
+        for depth in sorted(prefixes_by_level):
+            pending = {}
+            pending_prefixes = {}
+            for prefix in sorted(prefixes_by_level[depth]):
+                name = prefix[-1]
+                path_str = category_path_string(prefix)
+                if name in existing:
+                    category_id, current_path = existing[name]
+                    if current_path != path_str:
+                        path_fixes[category_id] = path_str
+                        existing[name] = (category_id, path_str)
+                    resolved[prefix] = category_id
+                    continue
+                if name not in pending:
+                    pending[name] = Category(
+                        name=name,
+                        parent_id=resolved.get(prefix[:-1]),
+                        path=path_str,
+                        lft=0, rght=0, tree_id=0, level=0,
+                    )
+                pending_prefixes[prefix] = name
+
+            if not pending:
+                continue
+            # Parents created earlier in this call are known; existing ones are read
+            parent_ids = list({category.parent_id for category in pending.values()} - tree_ids.keys() - {None})
+            for start in range(0, len(parent_ids), batch_size):
+                tree_ids.update(
+                    Category.objects.filter(id__in=parent_ids[start:start + batch_size]).values_list('id', 'tree_id')
+                )
+            for category in pending.values():
+                if category.parent_id is not None:
+                    category.tree_id = tree_ids[category.parent_id]
+                    continue
+                if next_tree_id is None:
+                    next_tree_id = (Category.objects.aggregate(Max('tree_id'))['tree_id__max'] or 0) + 1
+                category.tree_id = next_tree_id
+                next_tree_id += 1
+            Category.objects.bulk_create(pending.values(), batch_size=batch_size)
+            for name, category in pending.items():
+                existing[name] = (category.id, category.path)
+                tree_ids[category.id] = category.tree_id
+            for prefix, name in pending_prefixes.items():
+                resolved[prefix] = existing[name][0]
+            created += len(pending)
+
+        if path_fixes:
+            Category.objects.bulk_update(
+                [Category(id=category_id, path=path) for category_id, path in path_fixes.items()],
+                ['path'],
+                batch_size=batch_size,
+            )
+        if created:
+            renumber_trees(set(tree_ids.values()), batch_size)
+        if created or path_fixes:
+            invalidate_tree()
+        return resolved, created
+
+    def get_or_create(self, components):
+        """Return ``(leaf category id, created paths)`` for one path.
+
+        Known components cost no query. Missing ones are saved one by one so
+        MPTT inserts them in place, which is cheaper than a full rebuild when
+        only a few categories are new.
+        """
+        existing = self.existing
+        parent_id = None
+        created = []
+        for depth in range(1, len(components) + 1):
+            name = components[depth - 1]
+            path_str = category_path_string(components[:depth])
+            if name in existing:
+                category_id, current_path = existing[name]
+                if current_path != path_str:
+                    Category.objects.filter(pk=category_id).update(path=path_str)
+                    existing[name] = (category_id, path_str)
+                    invalidate_tree()
+            else:
+                category = Category(name=name, parent_id=parent_id, path=path_str)
+                category.save()
+                category_id = category.pk
+                existing[name] = (category_id, path_str)
+                created.append(path_str)
+            parent_id = category_id
+        return parent_id, created
+
+
+def renumber_trees(tree_ids, batch_size=BATCH_SIZE):
+    """Recompute ``lft``/``rght``/``level`` of the trees ``tree_ids`` from the parent links.
+
+    ``partial_rebuild`` for several trees at once: their rows are read with
+    one query, siblings are numbered in ``order_insertion_by`` order and only
+    the rows whose values changed are written. Returns that number.
+    """
+    if not tree_ids:
+        return 0
+    current = {}
+    roots = []
+    children = defaultdict(list)
+    rows = Category.objects.filter(tree_id__in=tree_ids).order_by('tree_id', 'name')
+    for category_id, parent_id, lft, rght, level in rows.values_list('id', 'parent_id', 'lft', 'rght', 'level'):
+        current[category_id] = (lft, rght, level)
+        (children[parent_id] if parent_id is not None else roots).append(category_id)
+
+    changed = []
+    for root_id in roots:
+        position = 1
+        lefts = {}
+        stack = [(root_id, 0, True)]
+        while stack:
+            category_id, level, entering = stack.pop()
+            if entering:
+                lefts[category_id] = position
+                stack.append((category_id, level, False))
+                stack.extend((child_id, level + 1, True) for child_id in reversed(children[category_id]))
+            else:
+                values = (lefts[category_id], position, level)
+                if values != current[category_id]:
+                    changed.append(Category(id=category_id, lft=values[0], rght=values[1], level=level))
+            position += 1
+    Category.objects.bulk_update(changed, ['lft', 'rght', 'level'], batch_size=batch_size)
+    return len(changed)
+
+
+_path_ids = FacetCache(getattr(settings, 'CATEGORY_FACET_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def category_id_for_path(path):
+    """Id of the category with ``path``, or ``None``.
+
+    Found ids are kept in a bounded LRU that is dropped when the tree version
+    changes; misses are not cached, so arbitrary lookups cannot fill it.
+    """
+    path = path.strip()
+    version = tree_version()
+    hits, _ = _path_ids.lookup([path], version)
+    if path in hits:
+        return hits[path]
+    category_id = Category.objects.filter(path=path).values_list('id', flat=True).first()
+    if category_id is not None:
+        _path_ids.store({path: category_id}, version)
+    return category_id
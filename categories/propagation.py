@@ -0,0 +1,306 @@
+"""Set-based propagation of attribute assignments along the category tree.
+
+Ancestor and descendant sets are resolved from the MPTT ``tree_id``/``lft``/
+``rght`` columns instead of walking model instances, and through-table
+changes are written with a single ``bulk_create(ignore_conflicts=True)`` or a
+single filtered delete per operation.
+
+Every write also maintains ``EffectiveAttribute``, which records for each
+through row the category the attribute was assigned to.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from .cache import invalidate_tree
+from .models import Attribute, Category, EffectiveAttribute
+from .tree import CategoryTree
+
+BATCH_SIZE = 1000
+
+
+def through_model():
+    return Attribute.categories.through
+
+
+def attributes_not_assigned(category_id):
+    """Attributes not linked to the category, as a ``NOT EXISTS`` anti-join.
+
+    The correlated probe is answered from the (category_id, attribute_id)
+    index on the through table, one index lookup per attribute.
+    """
+    return Attribute.objects.exclude(
+        Exists(through_model().objects.filter(category_id=category_id, attribute_id=OuterRef('pk'))),
+    )
+
+
+def categories_without_attribute(attribute_id):
+    """Categories not linked to the attribute, as a ``NOT EXISTS`` anti-join."""
+    return Category.objects.exclude(
+        Exists(through_model().objects.filter(attribute_id=attribute_id, category_id=OuterRef('pk'))),
+    )
+
+
+def ancestors_queryset(category, include_self=True):
+    """Categories on the path from the root down to ``category``."""
+    if include_self:
+        bounds = {'lft__lte': category.lft, 'rght__gte': category.rght}
+    else:
+        bounds = {'lft__lt': category.lft, 'rght__gt': category.rght}
+    return Category.objects.filter(tree_id=category.tree_id, **bounds)
+
+
+def descendants_queryset(category, include_self=True):
+    """Categories in the subtree rooted at ``category``."""
+    if include_self:
+        bounds = {'lft__gte': category.lft, 'rght__lte': category.rght}
+    else:
+        bounds = {'lft__gt': category.lft, 'rght__lt': category.rght}
+    return Category.objects.filter(tree_id=category.tree_id, **bounds)
+
+
+def ancestor_ids(category, include_self=True):
+    return list(ancestors_queryset(category, include_self).values_list('id', flat=True))
+
+
+def descendant_ids(category, include_self=True):
+    return list(descendants_queryset(category, include_self).values_list('id', flat=True))
+
+
+def ancestor_map(category_ids):
+    """Map each category id to the ids on its root path, itself included.
+
+    The affected trees are loaded into a ``CategoryTree`` with one query and
+    the parent links are walked in memory, so the closure of many categories
+    costs a single read. Unknown ids are omitted from the result.
+    """
+    category_ids = set(category_ids)
+    return CategoryTree.load_trees(category_ids).ancestor_map(category_ids)
+
+
+def write_assignments(rows, batch_size=BATCH_SIZE, count_created=False):
+    """Create every missing assignment for ``(category_id, attribute_id, source_id)`` rows.
+
+    A row whose source is its own category is a direct assignment, anything
+    else is inherited from ``source_id``. Existing through rows are left
+    alone; an existing inherited row becomes direct when assigned directly.
+    Returns the number of (category, attribute) pairs submitted or, with
+    ``count_created``, the number of through rows inserted, found by reading
+    the existing pairs before the insert.
+    """
+    by_pair = {}
+    for category_id, attribute_id, source_id in rows:
+        if category_id is None or attribute_id is None:
+            continue
+        if by_pair.get((category_id, attribute_id)) != category_id:
+            by_pair[(category_id, attribute_id)] = source_id
+    if not by_pair:
+        return 0
+
+    Through = through_model()
+    existing = 0
+    if count_created:
+        category_ids = list({category_id for category_id, _ in by_pair})
+        attribute_ids = {attribute_id for _, attribute_id in by_pair}
+        for start in range(0, len(category_ids), batch_size):
+            existing += sum(
+                1
+                for pair in Through.objects.filter(
+                    category_id__in=category_ids[start:start + batch_size], attribute_id__in=attribute_ids,
+                ).values_list('category_id', 'attribute_id')
+                if pair in by_pair
+            )
+    Through.objects.bulk_create(
+        [Through(category_id=category_id, attribute_id=attribute_id) for category_id, attribute_id in by_pair],
+        ignore_conflicts=True,
+        batch_size=batch_size,
+    )
+    direct, inherited = [], []
+    for (category_id, attribute_id), source_id in by_pair.items():
+        row = EffectiveAttribute(
+            category_id=category_id,
+            attribute_id=attribute_id,
+            source_id=source_id,
+            inherited=source_id != category_id,
+        )
+        (inherited if row.inherited else direct).append(row)
+    if inherited:
+        EffectiveAttribute.objects.bulk_create(inherited, ignore_conflicts=True, batch_size=batch_size)
+    if direct:
+        EffectiveAttribute.objects.bulk_create(
+            direct,
+            update_conflicts=True,
+            unique_fields=['category', 'attribute'],
+            update_fields=['source', 'inherited'],
+            batch_size=batch_size,
+        )
+    invalidate_tree()
+    return len(by_pair) - existing
+
+
+def bulk_assign_pairs(pairs, batch_size=BATCH_SIZE):
+    """Directly assign ``(category_id, attribute_id)`` pairs."""
+    return write_assignments(
+        ((category_id, attribute_id, category_id) for category_id, attribute_id in pairs),
+        batch_size=batch_size,
+    )
+
+
+def assign_with_ancestors(pairs, batch_size=BATCH_SIZE, count_created=False):
+    """Assign ``(category_id, attribute_id)`` pairs and propagate them upwards.
+
+    The ancestor closure of all categories involved is computed once, so the
+    cost does not depend on how many pairs share a branch.
+    """
+    pairs = set(pairs)
+    closure = ancestor_map(category_id for category_id, _ in pairs)
+    with transaction.atomic():
+        return write_assignments(
+            [
+                (ancestor_id, attribute_id, category_id)
+                for category_id, attribute_id in pairs
+                for ancestor_id in closure.get(category_id, ())
+            ],
+            batch_size=batch_size,
+            count_created=count_created,
+        )
+
+
+def bulk_unassign(categories, attribute_ids):
+    """Delete the through rows linking ``categories`` to ``attribute_ids``.
+
+    ``categories`` may be a list of ids or a ``Category`` queryset, in which
+    case it is used as a subquery and the delete is a single statement.
+    """
+    if isinstance(categories, (list, tuple, set)) and not categories:
+        return 0
+    attribute_ids = list(attribute_ids)
+    deleted, _ = through_model().objects.filter(
+        category_id__in=categories,
+        attribute_id__in=attribute_ids,
+    ).delete()
+    EffectiveAttribute.objects.filter(
+        category_id__in=categories,
+        attribute_id__in=attribute_ids,
+    ).delete()
+    if deleted:
+        invalidate_tree()
+    return deleted
+
+
+def add_to_ancestors(category, attribute_ids):
+    """Assign attributes to ``category`` and all of its ancestors."""
+    with transaction.atomic():
+        return write_assignments(
+            [
+                (ancestor_id, attribute_id, category.pk)
+                for ancestor_id in ancestor_ids(category, include_self=True)
+                for attribute_id in set(attribute_ids)
+            ]
+        )
+
+
+def add_to_descendants(category, attribute_ids):
+    """Copy attributes of ``category`` to all of its descendants as inherited."""
+    with transaction.atomic():
+        return write_assignments(
+            [
+                (descendant_id, attribute_id, category.pk)
+                for descendant_id in descendant_ids(category, include_self=False)
+                for attribute_id in set(attribute_ids)
+            ]
+        )
+
+
+def push_down(attribute_id, batch_size=None):
+    """Copy an attribute from every category that has it to all their descendants.
+
+    The missing ``(descendant, nearest holder)`` rows are found with one query
+    over the MPTT ranges of the holders, so the number of statements does not
+    depend on the size of the tree. ``batch_size=None`` lets the backend insert
+    them in as few statements as it allows.
+    """
+    Through = through_model()
+    holders = Category.objects.filter(
+        attributes__id=attribute_id,
+        tree_id=OuterRef('tree_id'),
+        lft__lt=OuterRef('lft'),
+        rght__gt=OuterRef('rght'),
+    ).order_by('-lft')
+    missing = Category.objects.filter(
+        tree_id__in=Through.objects.filter(attribute_id=attribute_id).values('category__tree_id'),
+    ).exclude(
+        Exists(Through.objects.filter(category_id=OuterRef('pk'), attribute_id=attribute_id)),
+    ).annotate(
+        source_id=Subquery(holders.values('id')[:1]),
+    ).filter(source_id__isnull=False).values_list('id', 'source_id')
+
+    with transaction.atomic():
+        return write_assignments(
+            [(category_id, attribute_id, source_id) for category_id, source_id in missing],
+            batch_size=batch_size,
+        )
+
+
+def replace_attributes(category, attribute_ids, batch_size=BATCH_SIZE):
+    """Make ``attribute_ids`` the attribute set of ``category``.
+
+    Attributes no longer submitted are unassigned from the category itself.
+    Every submitted attribute is then assigned to the category and its
+    ancestors and copied to its descendants, but only the pairs missing
+    across that whole branch are inserted: the existing rows are read with
+    one query. Returns ``(added, removed)`` pair counts.
+    """
+    attribute_ids = set(attribute_ids)
+    Through = through_model()
+    with transaction.atomic():
+        current = set(Through.objects.filter(category_id=category.pk).values_list('attribute_id', flat=True))
+        removed = bulk_unassign([category.pk], current - attribute_ids) if current - attribute_ids else 0
+        if not attribute_ids:
+            return 0, removed
+
+        upwards = ancestor_ids(category, include_self=False)
+        downwards = descendant_ids(category, include_self=False)
+        existing = set(Through.objects.filter(
+            category_id__in=upwards + downwards,
+            attribute_id__in=attribute_ids,
+        ).values_list('category_id', 'attribute_id'))
+
+        # The category's own rows are always written so kept attributes that
+        # were only inherited become direct assignments.
+        rows = [(category.pk, attribute_id, category.pk) for attribute_id in attribute_ids]
+        rows.extend(
+            (category_id, attribute_id, category.pk)
+            for category_id in upwards + downwards
+            for attribute_id in attribute_ids
+            if (category_id, attribute_id) not in existing
+        )
+        added = len(attribute_ids - current) + len(rows) - len(attribute_ids)
+        write_assignments(rows, batch_size=batch_size)
+    return added, removed
+
+
+def detach_moved_sources(category):
+    """Clear the source of inherited rows that a move of ``category`` cut off.
+
+    After the subtree moves, rows inside it copied from outside must come from
+    one of its new ancestors, and rows outside it copied from inside must be on
+    one of them. Other rows keep the attribute but lose their source, as when
+    the source is deleted. Call inside the move's transaction, with the MPTT
+    fields of the new position.
+    """
+    subtree = descendants_queryset(category, include_self=True).values('id')
+    ancestors = ancestors_queryset(category, include_self=False).values('id')
+    detached = EffectiveAttribute.objects.filter(
+        category_id__in=subtree, inherited=True, source__isnull=False,
+    ).exclude(source_id__in=subtree).exclude(source_id__in=ancestors).update(source=None)
+    detached += EffectiveAttribute.objects.filter(
+        source_id__in=subtree, inherited=True,
+    ).exclude(category_id__in=subtree).exclude(category_id__in=ancestors).update(source=None)
+    return detached
+
+
+def remove_from_subtree(category, attribute_ids):
+    """Unassign attributes from ``category`` and all of its descendants."""
+    with transaction.atomic():
+        subtree = descendants_queryset(category, include_self=True).values('id')
+        return bulk_unassign(subtree, attribute_ids)
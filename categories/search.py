@@ -0,0 +1,310 @@
+"""Ranked name search for categories and attributes.
+
+On PostgreSQL matches come from ``icontains`` and the pg_trgm ``%`` operator, all
+served by the GIN trigram indexes created in migration 0006, and are ordered
+by trigram similarity. Other databases use an in-memory n-gram index that
+applies the same matching rules and similarity measure, so local development
+on SQLite returns the same results in the same order.
+
+Autocomplete can instead be answered from in-memory sorted arrays of names
+and name tokens (``PrefixIndex``) by setting ``CATEGORY_SEARCH_BACKEND`` to
+``'memory'``; the default ``'database'`` keeps every lookup in SQL.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .cache import tree_version
+from .models import Attribute, Category
+
+# pg_trgm's default pg_trgm.similarity_threshold, used by the % operator
+SIMILARITY_THRESHOLD = 0.3
+# Upper bound on in-memory matches turned into an ORDER BY
+MAX_RANKED_MATCHES = 1000
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def trigrams(text):
+    """Trigrams of ``text`` as pg_trgm extracts them (per word, padded, lowercased)."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(left, right):
+    """pg_trgm similarity of two trigram sets."""
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+class NgramIndex:
+    """In-memory trigram index over one or more text fields per object."""
+
+    def __init__(self, entries):
+        """``entries`` yields ``(pk, sort_key, texts)``."""
+        self.entries = {}
+        self.postings = defaultdict(set)
+        for pk, sort_key, texts in entries:
+            lowered = [text.lower() for text in texts]
+            grams = [trigrams(text) for text in texts]
+            self.entries[pk] = (sort_key, lowered, grams)
+            for gram_set in grams:
+                for gram in gram_set:
+                    self.postings[gram].add(pk)
+
+    def search(self, query, threshold=SIMILARITY_THRESHOLD):
+        """Return pks matching ``query`` by substring or similarity, best first."""
+        needle = query.lower()
+        query_grams = trigrams(query)
+
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self.postings.get(gram, set())
+        if len(needle) < 3 or not query_grams:
+            # Too short to narrow down by trigrams: substring matches need a scan
+            candidates = set(self.entries)
+
+        ranked = []
+        for pk in candidates:
+            sort_key, texts, grams = self.entries[pk]
+            score = max(similarity(query_grams, gram_set) for gram_set in grams)
+            if score >= threshold or any(needle in text for text in texts):
+                ranked.append((-score, sort_key, pk))
+        ranked.sort()
+        return [pk for _, _, pk in ranked]
+
+
+_indexes = {}
+
+
+def _cached_index(name, build):
+    """Return the named index, rebuilding it whenever the tree version changes."""
+    version = tree_version()
+    cached = _indexes.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, build())
+        _indexes[name] = cached
+    return cached[1]
+
+
+def category_index():
+    return _cached_index('categories', lambda: NgramIndex(
+        (pk, name, [name, path.replace('_', ' ')])
+        for pk, name, path in Category.objects.values_list('id', 'name', 'path').iterator()
+    ))
+
+
+def attribute_index():
+    return _cached_index('attributes', lambda: NgramIndex(
+        (pk, name, [name])
+        for pk, name in Attribute.objects.values_list('id', 'name').iterator()
+    ))
+
+
+def _allowed_keys(queryset, key_field):
+    """Keys left in ``queryset`` by the caller's filters, or ``None`` if it is unfiltered."""
+    if not queryset.query.has_filters():
+        return None
+    return set(queryset.values_list(key_field, flat=True))
+
+
+def _rank(queryset, query, fields, key_field, index):
+    if connection.vendor == 'postgresql':
+        # Imported here so other backends work without psycopg
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        scores = [TrigramSimilarity(field, query) for field in fields]
+        matches = reduce(or_, (
+            Q(**{f'{field}__icontains': query}) | Q(TrigramSimilar(F(field), Value(query)))
+            for field in fields
+        ))
+        return queryset.annotate(
+            similarity=Greatest(*scores) if len(scores) > 1 else scores[0],
+        ).filter(matches).order_by('-similarity', fields[0])
+
+    # The caller's filters apply before the cut, as they do in SQL
+    ranked = index().search(query)
+    allowed = _allowed_keys(queryset, key_field)
+    if allowed is not None:
+        ranked = [pk for pk in ranked if pk in allowed]
+    return _in_ranked_order(queryset, key_field, ranked[:MAX_RANKED_MATCHES])
+
+
+def _in_ranked_order(queryset, key_field, ranked):
+    if not ranked:
+        return queryset.none()
+    return queryset.filter(**{f'{key_field}__in': ranked}).order_by(Case(
+        *[When(**{key_field: pk}, then=Value(position)) for position, pk in enumerate(ranked)],
+        output_field=IntegerField(),
+    ))
+
+
+def rank_categories(queryset, query):
+    """Filter a Category queryset to ``query`` matches on name or path, best first."""
+    return _rank(queryset, query, ['name', 'path'], 'pk', category_index)
+
+
+def rank_attributes(queryset, query, attribute_field=''):
+    """Filter a queryset to rows whose attribute name matches ``query``, best first.
+
+    ``attribute_field`` is the relation to ``Attribute`` for querysets of other
+    models, e.g. ``'attribute'`` for ``EffectiveAttribute``.
+    """
+    prefix = f'{attribute_field}__' if attribute_field else ''
+    key_field = f'{attribute_field}_id' if attribute_field else 'pk'
+    return _rank(queryset, query, [f'{prefix}name'], key_field, attribute_index)
+
+
+def search_backend():
+    return getattr(settings, 'CATEGORY_SEARCH_BACKEND', 'database')
+
+
+class PrefixIndex:
+    """Sorted arrays of lowercased names and name tokens for prefix lookups.
+
+    A lookup is two binary searches per query word plus the work needed to
+    order the matches, so it does not depend on the number of entries.
+    """
+
+    def __init__(self, entries):
+        """``entries`` yields ``(pk, name, tokens, payload)``."""
+        self.payloads = {}
+        self.sort_keys = {}
+        names = []
+        tokens = []
+        for pk, name, entry_tokens, payload in entries:
+            self.payloads[pk] = payload
+            self.sort_keys[pk] = name.lower()
+            names.append((name.lower(), pk))
+            tokens.extend((token, pk) for token in set(entry_tokens))
+        names.sort()
+        tokens.sort()
+        self.names = [name for name, _ in names]
+        self.name_ids = [pk for _, pk in names]
+        self.tokens = [token for token, _ in tokens]
+        self.token_ids = [pk for _, pk in tokens]
+
+    @staticmethod
+    def _prefix_range(keys, ids, prefix):
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + '\U0010ffff', start)
+        return ids[start:end]
+
+    def search(self, query, limit=None, accept=None):
+        """Return payloads whose name starts with ``query``, then token matches.
+
+        A token match needs every word of ``query`` to be the prefix of one
+        of the entry's tokens. Both groups are ordered by name; ``accept``
+        optionally filters pks.
+        """
+        needle = query.strip().lower()
+        if not needle:
+            return []
+        accept = accept or (lambda pk: True)
+
+        results = []
+        seen = set()
+        # Name prefix matches come out of the sorted array already in name order
+        for pk in self._prefix_range(self.names, self.name_ids, needle):
+            if accept(pk):
+                results.append(pk)
+                seen.add(pk)
+                if limit is not None and len(results) >= limit:
+                    return [self.payloads[pk] for pk in results]
+
+        matched = None
+        for word in _WORD_RE.findall(needle):
+            ids = set(self._prefix_range(self.tokens, self.token_ids, word))
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                break
+        remaining = [pk for pk in matched or () if pk not in seen and accept(pk)]
+        if limit is None:
+            remaining.sort(key=self.sort_keys.__getitem__)
+        else:
+            remaining = heapq.nsmallest(limit - len(results), remaining, key=self.sort_keys.__getitem__)
+        return [self.payloads[pk] for pk in results + remaining]
+
+
+def category_prefix_index():
+    """Categories keyed by name and by the words of every path component.
+
+    Payloads are ``(id, name, path, tree_id, lft, rght)`` so subtree
+    exclusion can be decided without a query.
+    """
+    def build():
+        rows = Category.objects.values_list('id', 'name', 'path', 'tree_id', 'lft', 'rght')
+        return PrefixIndex(
+            (row[0], row[1], _WORD_RE.findall(row[2].lower()), row)
+            for row in rows.iterator()
+        )
+    return _cached_index('category-prefixes', build)
+
+
+def attribute_prefix_index():
+    return _cached_index('attribute-prefixes', lambda: PrefixIndex(
+        (pk, name, _WORD_RE.findall(name.lower()), pk)
+        for pk, name in Attribute.objects.values_list('id', 'name').iterator()
+    ))
+
+
+def autocomplete_categories(query, exclude_id=None, limit=100):
+    """Return ``(id, name, path)`` of categories matching ``query`` by prefix.
+
+    The subtree of ``exclude_id``, if given, is left out of the results.
+    """
+    index = category_prefix_index()
+    accept = None
+    excluded = index.payloads.get(exclude_id)
+    if excluded is not None:
+        _, _, _, tree_id, lft, rght = excluded
+
+        def accept(pk):
+            row = index.payloads[pk]
+            return not (row[3] == tree_id and lft <= row[4] and row[5] <= rght)
+
+    return [row[:3] for row in index.search(query, limit=limit, accept=accept)]
+
+
+def prefix_attributes(queryset, query, attribute_field=''):
+    """Filter a queryset to attributes whose name or a name word starts with ``query``."""
+    key_field = f'{attribute_field}_id' if attribute_field else 'pk'
+    allowed = _allowed_keys(queryset, key_field)
+    return _in_ranked_order(
+        queryset,
+        key_field,
+        attribute_prefix_index().search(
+            query,
+            limit=MAX_RANKED_MATCHES,
+            accept=allowed.__contains__ if allowed is not None else None,
+        ),
+    )
+
+
+def warm_prefix_indexes(**kwargs):
+    """Build the in-memory indexes once, before the first request is handled."""
+    request_started.disconnect(warm_prefix_indexes)
+    category_prefix_index()
+    attribute_prefix_index()
+
+
+def schedule_prefix_index_warmup():
+    # Building from AppConfig.ready directly would query the database in every
+    # management command and before the test runner swaps databases.
+    if search_backend() == 'memory':
+        request_started.connect(warm_prefix_indexes)
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_tree
+from .models import Attribute, Category, EffectiveAttribute
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def category_data_changed(sender, **kwargs):
+    invalidate_tree()
+
+
+@receiver(m2m_changed, sender=Attribute.categories.through)
+def category_attributes_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_tree()
+
+
+@receiver(m2m_changed, sender=Attribute.categories.through)
+def mirror_effective_attributes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep EffectiveAttribute in step with add/remove/clear on the relation.
+
+    Assignments made through the ORM relation are direct; propagation writes
+    the through table in bulk and records inherited rows itself.
+    """
+    # reverse: category.attributes.<action>(); otherwise attribute.categories.<action>()
+    own_field = 'category_id' if reverse else 'attribute_id'
+    other_field = 'attribute_id' if reverse else 'category_id'
+
+    if action == 'post_add' and pk_set:
+        EffectiveAttribute.objects.bulk_create(
+            [
+                EffectiveAttribute(
+                    **{own_field: instance.pk, other_field: pk},
+                    source_id=instance.pk if reverse else pk,
+                    inherited=False,
+                )
+                for pk in pk_set
+            ],
+            update_conflicts=True,
+            unique_fields=['category', 'attribute'],
+            update_fields=['source', 'inherited'],
+        )
+    elif action == 'post_remove' and pk_set:
+        EffectiveAttribute.objects.filter(**{own_field: instance.pk, f'{other_field}__in': pk_set}).delete()
+    elif action == 'post_clear':
+        EffectiveAttribute.objects.filter(**{own_field: instance.pk}).delete()
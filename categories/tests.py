@@ -0,0 +1,1126 @@
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mptt.managers import TreeManager
+
+import extract_category_and_attribute
+
+from .cache import tree_version
+from .export import csv_chunks, export_chunks, jsonl_chunks
+from .importing import load_changed_category_attributes
+from .management.commands.ingest_feed import Command as IngestFeedCommand
+from .models import Attribute, Category, EffectiveAttribute
+from . import paths as paths_module
+from .parsing import category_path_string
+from .paths import category_id_for_path
+from .propagation import BATCH_SIZE, bulk_assign_pairs
+from .search import prefix_attributes, rank_attributes, rank_categories
+from .tree import CategoryTree
+
+
+def build_tree(prefix, depth, fanout):
+    """Create a complete tree with one bulk insert per level and return its root."""
+    root = Category.objects.create(name=prefix)
+    level = [root]
+    for _ in range(1, depth):
+        children = [
+            Category(
+                name=f"{parent.name}-{index}",
+                parent=parent,
+                path=f"{parent.path}__{index}",
+                lft=0, rght=0, tree_id=0, level=0,
+            )
+            for parent in level
+            for index in range(fanout)
+        ]
+        Category.objects.bulk_create(children)
+        level = children
+    Category.objects.rebuild()
+    return Category.objects.get(pk=root.pk)
+
+
+def count_queries(func):
+    """Count the statements ``func`` runs, apart from INSERTs.
+
+    Bulk inserts are a single statement on PostgreSQL but SQLite splits them by
+    its parameter limit, so they would make the count depend on the row count.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return sum(1 for query in queries if not query['sql'].startswith('INSERT'))
+
+
+class AttributeCascadeQueryCountTests(TestCase):
+    """Attribute.save and Attribute.delete must not scale with the tree size."""
+
+    def setUp(self):
+        self.small = build_tree('small', depth=2, fanout=2)
+        self.large = build_tree('large', depth=4, fanout=6)
+
+    def assign_to_root(self, root):
+        attribute = Attribute.objects.create(name=f"attr-{root.name}")
+        root.attributes.add(attribute)
+        return attribute
+
+    def test_save_query_count_is_independent_of_tree_size(self):
+        small_attribute = self.assign_to_root(self.small)
+        large_attribute = self.assign_to_root(self.large)
+
+        small_queries = count_queries(small_attribute.save)
+        large_queries = count_queries(large_attribute.save)
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(
+            large_attribute.categories.count(),
+            self.large.get_descendant_count() + 1,
+        )
+
+    def test_save_without_missing_descendants_is_a_single_read(self):
+        attribute = self.assign_to_root(self.large)
+        attribute.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            attribute.save()
+
+        reads = [query for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(reads), 1)
+
+    def test_delete_query_count_is_independent_of_tree_size(self):
+        small_attribute = self.assign_to_root(self.small)
+        large_attribute = self.assign_to_root(self.large)
+        small_attribute.save()
+        large_attribute.save()
+
+        small_queries = count_queries(small_attribute.delete)
+        large_queries = count_queries(large_attribute.delete)
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertFalse(Attribute.categories.through.objects.exists())
+
+
+# Benchmark scale. The defaults keep the suite fast; e.g. DEPTH=6, FANOUT=10,
+# ATTRIBUTES=20000, ASSIGNMENTS=10 gives ~111k categories and ~1.1M assignments.
+BENCH_DEPTH = int(os.environ.get('CATEGORIES_BENCH_DEPTH', 4))
+BENCH_FANOUT = int(os.environ.get('CATEGORIES_BENCH_FANOUT', 4))
+BENCH_ATTRIBUTES = int(os.environ.get('CATEGORIES_BENCH_ATTRIBUTES', 200))
+BENCH_ASSIGNMENTS = int(os.environ.get('CATEGORIES_BENCH_ASSIGNMENTS', 5))
+# Wall times are always recorded but only checked against their budgets when
+# CATEGORIES_BENCH_TIMES=1, since they depend on the machine
+BENCH_TIMES = os.environ.get('CATEGORIES_BENCH_TIMES') == '1'
+# Wall-time budgets are for the default scale; multiply them for larger trees
+BENCH_TIME_FACTOR = float(os.environ.get('CATEGORIES_BENCH_TIME_FACTOR', 1))
+# Optional path of a JSON file the measured query counts and times are written to
+BENCH_REPORT = os.environ.get('CATEGORIES_BENCH_REPORT')
+
+BUDGETS = json.loads((Path(__file__).parent / 'benchmark_budgets.json').read_text())
+RESULTS = {}
+
+
+class BenchmarkTestCase(TestCase):
+    """Runs operations against a synthetic tree and checks them against budgets.
+
+    Every measurement counts the statements run (apart from INSERTs, see
+    ``count_queries``) and the wall time, records both and fails when the
+    statements exceed the budget stored under its name in
+    ``benchmark_budgets.json``. Wall times are only checked against theirs
+    when ``CATEGORIES_BENCH_TIMES=1``.
+    Query budgets do not depend on the scale, so running the suite on a
+    larger tree catches operations whose query count grows with the data.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        cls.root = build_tree('bench', depth=BENCH_DEPTH, fanout=BENCH_FANOUT)
+        Attribute.objects.bulk_create(
+            [Attribute(name=f'bench-attribute-{index}') for index in range(BENCH_ATTRIBUTES)],
+            batch_size=BATCH_SIZE,
+        )
+        attribute_ids = list(Attribute.objects.values_list('id', flat=True))
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        bulk_assign_pairs(
+            (category_id, attribute_id)
+            for category_id in category_ids
+            for attribute_id in rng.sample(attribute_ids, min(BENCH_ASSIGNMENTS, len(attribute_ids)))
+        )
+        # A mid-level category with children, and a leaf
+        cls.branch = Category.objects.filter(level=min(1, BENCH_DEPTH - 1)).order_by('lft').first()
+        cls.leaf = Category.objects.filter(rght=F('lft') + 1).order_by('-lft').first()
+        cls.attribute = Attribute.objects.order_by('id').first()
+
+    def setUp(self):
+        # on_commit never fires inside TestCase, so reset the versioned caches.
+        # Outside a fresh install the version key exists, so measure with it set.
+        cache.clear()
+        tree_version()
+        self.root.refresh_from_db()
+        self.branch.refresh_from_db()
+        self.leaf.refresh_from_db()
+        self.attribute.refresh_from_db()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if BENCH_REPORT:
+            Path(BENCH_REPORT).write_text(json.dumps({
+                'scale': {
+                    'depth': BENCH_DEPTH,
+                    'fanout': BENCH_FANOUT,
+                    'attributes': BENCH_ATTRIBUTES,
+                    'assignments_per_category': BENCH_ASSIGNMENTS,
+                },
+                'results': RESULTS,
+            }, indent=2, sort_keys=True))
+
+    def measure(self, name, func):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = func()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        statements = sum(1 for query in queries if not query['sql'].startswith('INSERT'))
+        RESULTS[name] = {'queries': statements, 'ms': round(elapsed_ms, 2)}
+
+        budget = BUDGETS[name]
+        self.assertLessEqual(
+            statements, budget['queries'],
+            f"{name} ran {statements} queries, budget {budget['queries']}",
+        )
+        if BENCH_TIMES:
+            self.assertLessEqual(
+                elapsed_ms, budget['ms'] * BENCH_TIME_FACTOR,
+                f"{name} took {elapsed_ms:.1f} ms, budget {budget['ms'] * BENCH_TIME_FACTOR:.1f} ms",
+            )
+        return result
+
+    def get(self, name, url, expected_status=200, **kwargs):
+        response = self.measure(name, lambda: self.client.get(url, **kwargs))
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def post(self, name, url, data=None, expected_status=200, **kwargs):
+        response = self.measure(name, lambda: self.client.post(url, data or {}, **kwargs))
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+
+class EndpointBenchmarkTests(BenchmarkTestCase):
+    """Every URL in categories/urls.py."""
+
+    def test_category_list(self):
+        self.get('category_list_home', reverse('category_list_home'))
+        self.get('category_list', reverse('category_list'))
+
+    def test_category_detail(self):
+        self.get('category_detail', reverse('category_detail', args=[self.branch.pk]))
+
+    def test_category_add(self):
+        self.get('category_add_form', reverse('category_add'))
+        self.post(
+            'category_add',
+            reverse('category_add'),
+            {'name': 'bench-new', 'parent': self.branch.pk},
+            expected_status=302,
+        )
+
+    def test_category_edit(self):
+        url = reverse('category_edit', args=[self.leaf.pk])
+        self.get('category_edit_form', url)
+        self.post('category_edit', url, {'name': 'bench-renamed', 'parent': self.leaf.parent_id}, expected_status=302)
+
+    def test_category_delete(self):
+        self.post('category_delete', reverse('category_delete', args=[self.branch.pk]), expected_status=302)
+        self.assertFalse(Category.objects.filter(pk=self.branch.pk).exists())
+
+    def test_manage_category_attributes(self):
+        url = reverse('manage_category_attributes', args=[self.branch.pk])
+        self.get('manage_category_attributes_form', url)
+        attribute_ids = list(Attribute.objects.order_by('-id').values_list('id', flat=True)[:20])
+        self.post('manage_category_attributes', url, {'attributes': attribute_ids}, expected_status=302)
+
+    def test_attribute_list(self):
+        self.get('attribute_list', reverse('attribute_list'))
+
+    def test_attribute_add(self):
+        self.get('attribute_add_form', reverse('attribute_add'))
+        self.post(
+            'attribute_add',
+            reverse('attribute_add'),
+            {'name': 'bench-new', 'categories': [self.branch.pk]},
+            expected_status=302,
+        )
+
+    def test_attribute_detail(self):
+        url = reverse('attribute_detail', args=[self.attribute.pk])
+        self.get('attribute_detail', url, data={'available_page': 2})
+        self.get('attribute_detail_keyset', url, data={'paginate': 'keyset'})
+
+    def test_attribute_edit(self):
+        url = reverse('attribute_edit', args=[self.attribute.pk])
+        self.get('attribute_edit_form', url)
+        self.post(
+            'attribute_edit',
+            url,
+            {'name': self.attribute.name, 'categories': [self.branch.pk, self.leaf.pk]},
+            expected_status=302,
+        )
+
+    def test_attribute_delete(self):
+        self.post('attribute_delete', reverse('attribute_delete', args=[self.attribute.pk]), expected_status=302)
+        self.assertFalse(Attribute.objects.filter(pk=self.attribute.pk).exists())
+
+    def test_category_add_and_remove_attribute(self):
+        url_args = [self.leaf.pk, self.attribute.pk]
+        self.post('category_add_attribute', reverse('category_add_attribute', args=url_args), expected_status=302)
+        self.post(
+            'category_remove_attribute',
+            reverse('category_remove_attribute', args=url_args),
+            expected_status=302,
+        )
+
+    def test_api_create_category(self):
+        self.post('api_create_category', reverse('api_create_category'), {'name': 'bench-api', 'parent_id': self.leaf.pk})
+
+    def test_api_category_tree(self):
+        self.get('api_category_tree', reverse('category_tree'))
+        self.get('api_category_tree_depth', reverse('category_tree'), data={'depth': 2})
+
+    def test_api_category_tree_snapshot(self):
+        response = self.get('api_category_tree_snapshot', reverse('category_tree_snapshot'))
+        self.get(
+            'api_category_tree_snapshot_not_modified',
+            reverse('category_tree_snapshot'),
+            expected_status=304,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+
+    def test_api_category_attributes(self):
+        url = reverse('category_attributes', args=[self.branch.pk])
+        self.get('api_category_attributes', url, data={'available_page': 3})
+        self.get('api_category_attributes_search', url, data={'available_search': 'attribute-1'})
+        self.get('api_category_attributes_keyset', url, data={'paginate': 'keyset'})
+
+    def test_api_search_categories(self):
+        url = reverse('api_search_categories')
+        self.get('api_search_categories', url, data={'q': 'bench-1', 'exclude': self.branch.pk})
+        with self.settings(CATEGORY_SEARCH_BACKEND='memory'):
+            self.client.get(url, data={'q': 'warm'})
+            self.get('api_search_categories_memory', url, data={'q': 'bench-1'})
+
+    def test_api_update_category(self):
+        url = reverse('api_update_category', args=[self.branch.pk])
+        self.post('api_update_category', url, {'name': 'bench-renamed'})
+        other_root = build_tree('other', depth=2, fanout=2)
+        self.post('api_move_category', url, {'name': 'bench-renamed', 'parent_id': other_root.pk})
+
+    def test_api_delete_category(self):
+        self.measure(
+            'api_delete_category',
+            lambda: self.client.delete(reverse('api_delete_category', args=[self.branch.pk])),
+        )
+        self.assertFalse(Category.objects.filter(pk=self.branch.pk).exists())
+
+    def test_api_add_and_remove_attribute(self):
+        url_args = [self.leaf.pk, self.attribute.pk]
+        self.get('api_add_category_attribute', reverse('api_add_category_attribute', args=url_args))
+        self.post('api_remove_category_attribute', reverse('api_remove_category_attribute', args=url_args))
+
+    def test_api_add_attribute_by_name(self):
+        self.post(
+            'api_add_category_attribute_by_name',
+            reverse('category_add_attribute_by_name', args=[self.leaf.pk]),
+            {'name': 'bench-by-name'},
+        )
+
+    def test_api_bulk_add_attributes(self):
+        leaves = Category.objects.filter(rght=F('lft') + 1).values_list('id', flat=True)[:50]
+        self.post(
+            'api_bulk_add_category_attributes',
+            reverse('api_bulk_add_category_attributes'),
+            json.dumps({'assignments': [
+                {'category': category_id, 'attribute': name}
+                for category_id in leaves
+                for name in ('bench-bulk-1', 'bench-bulk-2', self.attribute.pk)
+            ]}),
+            content_type='application/json',
+        )
+
+    def test_api_search_attributes(self):
+        self.get('api_search_attributes', reverse('search_attributes'), data={'q': self.leaf.path})
+        self.get('api_search_attributes_cached', reverse('search_attributes'), data={'q': self.leaf.path})
+
+    def test_api_async_read_endpoints(self):
+        """The async variants answer exactly like the sync views."""
+        requests = [
+            ('category_tree', 'async_category_tree', [], {'depth': 2}),
+            ('api_search_categories', 'async_search_categories', [], {'q': 'bench-1', 'exclude': self.branch.pk}),
+            ('category_attributes', 'async_category_attributes', [self.branch.pk], {'available_page': 3}),
+            ('category_attributes', 'async_category_attributes', [self.branch.pk], {'paginate': 'keyset'}),
+            ('search_attributes', 'async_search_attributes', [], {'q': self.leaf.path}),
+        ]
+        for sync_name, async_name, args, data in requests:
+            expected = self.client.get(reverse(sync_name, args=args), data=data).json()
+            cache.clear()
+            tree_version()
+            name = f"api_{async_name}_keyset" if 'paginate' in data else f"api_{async_name}"
+            response = self.get(name, reverse(async_name, args=args), data=data)
+            self.assertEqual(response.json(), expected)
+        self.get('api_async_category_attributes_missing', reverse('async_category_attributes', args=[0]),
+                 expected_status=404)
+
+    def test_api_resolve_facets(self):
+        product_type = self.leaf.path.replace('__', ' > ')
+        url = reverse('resolve_facets')
+        self.get('api_resolve_facets', url, data={'product_type': product_type})
+        self.get('api_resolve_facets_cached', url, data={'product_type': product_type})
+        paths = Category.objects.values_list('path', flat=True)[:200]
+        self.post(
+            'api_resolve_facets_batch',
+            url,
+            json.dumps({'product_types': [path.replace('__', ' > ') for path in paths]}),
+            content_type='application/json',
+        )
+
+    def test_api_export(self):
+        for export_format in ('csv', 'jsonl'):
+            response = self.measure(
+                f'api_export_{export_format}',
+                lambda: b''.join(self.client.get(
+                    reverse('export_category_attributes'), data={'format': export_format},
+                ).streaming_content),
+            )
+            self.assertTrue(response)
+
+
+class ModelOperationBenchmarkTests(BenchmarkTestCase):
+    """Category and Attribute model operations."""
+
+    def test_category_create(self):
+        self.measure('model_category_create', lambda: Category.objects.create(name='bench-new', parent=self.branch))
+
+    def test_category_add_attribute(self):
+        self.measure('model_category_add_attribute', lambda: self.leaf.add_attribute(self.attribute))
+
+    def test_category_remove_attribute(self):
+        self.measure('model_category_remove_attribute', lambda: self.branch.remove_attribute(self.attribute))
+
+    def test_category_set_attributes(self):
+        attribute_ids = Attribute.objects.order_by('-id').values_list('id', flat=True)[:20]
+        self.measure('model_category_set_attributes', lambda: self.branch.set_attributes(list(attribute_ids)))
+
+    def test_category_delete_subtree(self):
+        self.measure('model_category_delete_subtree', self.branch.delete_subtree)
+
+    def test_category_rename_and_move(self):
+        other_root = build_tree('other', depth=2, fanout=2)
+        self.measure('model_category_rename_and_move', lambda: self.branch.rename_and_move('bench-moved', other_root))
+        descendant = self.branch.get_descendants().last()
+        self.assertTrue(descendant.path.startswith('other__'))
+
+    def test_category_update_paths_for_subtree(self):
+        self.branch.name = 'bench-renamed'
+        self.measure('model_category_update_paths_for_subtree', self.branch.update_paths_for_subtree)
+
+    def test_category_synchronize_attributes_with_ancestors(self):
+        self.measure(
+            'model_category_synchronize_attributes_with_ancestors',
+            self.branch.synchronize_attributes_with_ancestors,
+        )
+
+    def test_attribute_save(self):
+        self.root.attributes.add(self.attribute)
+        self.measure('model_attribute_save', self.attribute.save)
+        self.assertEqual(
+            EffectiveAttribute.objects.filter(attribute=self.attribute).count(),
+            Category.objects.count(),
+        )
+
+    def test_attribute_delete(self):
+        self.measure('model_attribute_delete', self.attribute.delete)
+
+
+FEED_ROWS = [
+    ('product_type', 'filterable_attributes', 'title'),
+    ('A > B', 'color:red, size:M', 'one'),
+    ('A > B > E', 'material:wood,color:blue', 'two'),
+    ('A > C', 'flag', 'three'),
+    ('D', 'none,other', 'four'),
+    ('A > B', 'size:L', 'five'),
+    ('F', '', 'no attributes column'),
+    ('', 'color:green', 'no product type'),
+]
+
+
+def write_feed(path, rows=FEED_ROWS):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+
+def baseline_extract(input_csv, chunksize=10000):
+    """The row-by-row loop of the original extraction script."""
+    product_type_keys = defaultdict(set)
+    with pd.read_csv(input_csv, chunksize=chunksize) as reader:
+        for chunk in reader:
+            for _, row in chunk.iterrows():
+                product_type_full = row.get("product_type", "")
+                filterable_attributes = row.get("filterable_attributes", "")
+                if pd.isna(product_type_full) or pd.isna(filterable_attributes):
+                    continue
+                keys = {attr.split(":")[0].strip() for attr in filterable_attributes.split(",") if ":" in attr}
+                parts = [part.strip() for part in product_type_full.split(">")]
+                for i in range(1, len(parts) + 1):
+                    product_type_keys[" > ".join(parts[:i])].update(keys)
+    return product_type_keys
+
+
+class FeedExtractionTests(SimpleTestCase):
+    """The vectorized extraction must write what the original script wrote."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.feed = os.path.join(self.directory.name, 'feed.csv')
+        write_feed(self.feed)
+
+    def output_files(self, product_type_keys, name):
+        output_dir = os.path.join(self.directory.name, name)
+        with redirect_stdout(io.StringIO()):
+            extract_category_and_attribute.save(product_type_keys, output_dir)
+        return {
+            filename: Path(output_dir, filename).read_text()
+            for filename in sorted(os.listdir(output_dir))
+        }
+
+    def test_categories_without_attribute_keys_are_kept(self):
+        expected = baseline_extract(self.feed)
+        self.assertEqual(set(expected), {'A', 'A > B', 'A > B > E', 'A > C', 'D'})
+
+        with redirect_stderr(io.StringIO()):
+            extracted, rows = extract_category_and_attribute.extract(self.feed, chunksize=3)
+        self.assertEqual(dict(extracted), dict(expected))
+        self.assertEqual(rows, len(FEED_ROWS) - 1)
+        self.assertEqual(self.output_files(extracted, 'new'), self.output_files(expected, 'old'))
+        self.assertEqual(self.output_files(extracted, 'new')['D.csv'], 'Attribute Keys\n')
+
+    def test_parallel_extraction_matches_serial(self):
+        with redirect_stderr(io.StringIO()):
+            serial, _ = extract_category_and_attribute.extract(self.feed)
+            parallel, rows = extract_category_and_attribute.extract_parallel(self.feed, workers=2, chunksize=2)
+        self.assertEqual(dict(parallel), dict(serial))
+        self.assertEqual(rows, len(FEED_ROWS) - 1)
+
+
+class IngestFeedTests(TestCase):
+    """ingest_feed builds the tree and assignments the extraction describes."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.feed = os.path.join(self.directory.name, 'feed.csv')
+        write_feed(self.feed)
+
+    def ingest(self, **options):
+        """Run the command, checking the MPTT fields after every flush; return the flush count."""
+        problems = []
+        flush_chunk = IngestFeedCommand.flush
+
+        def checked_flush(command, *args):
+            flush_chunk(command, *args)
+            problems.extend(CategoryTree.load().validate())
+
+        with mock.patch.object(IngestFeedCommand, 'flush', autospec=True, side_effect=checked_flush) as flush, \
+                mock.patch.object(TreeManager, 'rebuild', autospec=True) as rebuild:
+            call_command('ingest_feed', self.feed, stdout=io.StringIO(), **options)
+        self.assertEqual(problems, [])
+        self.assertEqual(rebuild.call_count, 0)
+        return flush.call_count
+
+    def assignments(self):
+        assigned = defaultdict(set)
+        for path, name in Attribute.categories.through.objects.values_list('category__path', 'attribute__name'):
+            assigned[path].add(name)
+        return dict(assigned)
+
+    def test_ingest_creates_tree_and_assignments(self):
+        # Flushing every two rows spreads the feed over several transactions
+        self.assertGreater(self.ingest(chunksize=2, flush_rows=2), 1)
+
+        expected = {
+            category_path_string(path.split(' > ')): keys
+            for path, keys in baseline_extract(self.feed).items()
+        }
+        self.assertEqual(set(Category.objects.values_list('path', flat=True)), set(expected))
+        self.assertEqual(self.assignments(), {path: keys for path, keys in expected.items() if keys})
+
+        parents = dict(Category.objects.values_list('path', 'parent__path'))
+        self.assertEqual(parents['A__B__E'], 'A__B')
+        self.assertEqual(parents['A__C'], 'A')
+        self.assertIsNone(parents['D'])
+        self.assertEqual(CategoryTree.load().validate(), [])
+        for category in Category.objects.all():
+            self.assertEqual(
+                [ancestor.path for ancestor in category.get_ancestors()],
+                ['__'.join(category.path.split('__')[:depth]) for depth in range(1, category.level + 1)],
+            )
+
+        effective = set(EffectiveAttribute.objects.values_list('category_id', 'attribute_id'))
+        self.assertEqual(effective, set(Attribute.categories.through.objects.values_list('category_id', 'attribute_id')))
+        self.assertFalse(EffectiveAttribute.objects.filter(category__path='A__B__E', inherited=True).exists())
+
+    def test_ingest_is_idempotent(self):
+        self.ingest()
+        categories = set(Category.objects.values_list('id', 'path', 'lft', 'rght'))
+        assignments = self.assignments()
+
+        self.ingest()
+        self.assertEqual(set(Category.objects.values_list('id', 'path', 'lft', 'rght')), categories)
+        self.assertEqual(self.assignments(), assignments)
+
+    def test_ingest_extends_existing_trees(self):
+        self.ingest()
+        write_feed(self.feed, [
+            FEED_ROWS[0],
+            ('A > AA', 'color:black', 'sorts before B'),
+            ('A > B > E > G', 'depth:4', 'deeper'),
+            ('D > H', 'size:S', 'under an existing root'),
+            ('0', 'new:root', 'sorts first'),
+        ])
+        self.ingest(chunksize=1, flush_rows=1)
+
+        parents = dict(Category.objects.values_list('path', 'parent__path'))
+        self.assertEqual(parents['A__B__E__G'], 'A__B__E')
+        self.assertEqual(parents['D__H'], 'D')
+        self.assertIsNone(parents['0'])
+        a = Category.objects.get(path='A')
+        self.assertEqual([child.path for child in a.get_children()], ['A__AA', 'A__B', 'A__C'])
+        self.assertEqual(
+            set(Attribute.objects.get(name='depth').categories.values_list('path', flat=True)),
+            {'A', 'A__B', 'A__B__E', 'A__B__E__G'},
+        )
+
+    def test_interrupted_ingest_leaves_a_sound_tree(self):
+        flushed = []
+        flush = IngestFeedCommand.flush
+
+        def flush_once(command, *args):
+            if flushed:
+                raise RuntimeError('interrupted')
+            flushed.append(flush(command, *args))
+
+        # The first flush commits A > B and A > B > E, then the command fails
+        with mock.patch.object(IngestFeedCommand, 'flush', autospec=True, side_effect=flush_once), \
+                self.assertRaises(RuntimeError):
+            call_command('ingest_feed', self.feed, stdout=io.StringIO(), chunksize=2, flush_rows=2)
+
+        self.assertEqual(set(Category.objects.values_list('path', flat=True)), {'A', 'A__B', 'A__B__E'})
+        self.assertEqual(CategoryTree.load().validate(), [])
+        probe = Attribute.objects.create(name='probe')
+        Category.objects.get(path='A__B').add_attribute(probe)
+        self.assertEqual(set(probe.categories.values_list('path', flat=True)), {'A', 'A__B'})
+        Category.objects.get(path='A__B__E').delete_subtree()
+        self.assertEqual(set(Category.objects.values_list('path', flat=True)), {'A', 'A__B'})
+
+
+class CategoryTreeTests(TestCase):
+    """CategoryTree must agree with MPTT on a tree reshaped by random moves."""
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.roots = [build_tree(f'tree{index}', depth=4, fanout=3) for index in range(2)]
+        for _ in range(15):
+            categories = list(Category.objects.all())
+            node = rng.choice(categories)
+            targets = [
+                category for category in categories
+                if not category.is_descendant_of(node, include_self=True)
+            ]
+            node.move_to(rng.choice(targets), rng.choice(['first-child', 'last-child', 'left', 'right']))
+
+    def test_matches_mptt(self):
+        tree = CategoryTree.load()
+        self.assertEqual(len(tree), Category.objects.count())
+        self.assertEqual(tree.validate(), [])
+        for category in Category.objects.all():
+            self.assertEqual(tree.ancestor_ids(category.pk), [c.pk for c in category.get_ancestors()])
+            self.assertEqual(tree.descendant_ids(category.pk), [c.pk for c in category.get_descendants()])
+            self.assertEqual(tree.children_ids(category.pk), [c.pk for c in category.get_children()])
+            self.assertEqual(tree.subtree_size(category.pk), category.get_descendant_count() + 1)
+
+    def test_ancestor_map_of_partial_load(self):
+        leaves = list(Category.objects.filter(rght=F('lft') + 1).values_list('id', flat=True))
+        closure = CategoryTree.load_trees(leaves[:5]).ancestor_map(leaves[:5] + [0])
+        self.assertEqual(set(closure), set(leaves[:5]))
+        for category_id, chain in closure.items():
+            category = Category.objects.get(pk=category_id)
+            self.assertEqual(
+                list(chain),
+                [category_id] + [c.pk for c in category.get_ancestors(ascending=True)],
+            )
+
+    def test_validate_reports_corrupted_ranges(self):
+        node = Category.objects.filter(level=2).order_by('tree_id', 'lft').first()
+        Category.objects.filter(pk=node.pk).update(rght=node.rght + 2)
+        problems = CategoryTree.load().validate()
+        self.assertTrue(any(f'category {node.pk}' in problem for problem in problems), problems)
+        self.assertTrue(any(problem.startswith(f'tree {node.tree_id}') for problem in problems), problems)
+
+        Category.objects.rebuild()
+        self.assertEqual(CategoryTree.load().validate(), [])
+
+    def test_validate_reports_wrong_parent(self):
+        node = Category.objects.filter(level=3).first()
+        other = Category.objects.exclude(pk=node.parent_id).filter(level=2).first()
+        Category.objects.filter(pk=node.pk).update(parent=other)
+        problems = CategoryTree.load().validate()
+        self.assertIn(f"category {node.pk}: parent {other.pk}, nesting says {node.parent_id}", problems)
+
+
+class IncrementalImportTests(TestCase):
+    """load_changed_category_attributes for unchanged, changed and deleted paths."""
+
+    mapping = {
+        ('A',): {'a1'},
+        ('A', 'B'): {'b1', 'b2'},
+        ('A', 'B', 'E'): {'e1'},
+        ('D',): {'d1'},
+    }
+
+    def setUp(self):
+        self.stats = load_changed_category_attributes(self.mapping)
+
+    def names(self, path):
+        return set(Attribute.objects.filter(categories__path=path).values_list('name', flat=True))
+
+    def test_first_import_creates_everything(self):
+        self.assertEqual(self.stats['categories_unchanged'], 0)
+        self.assertEqual(self.stats['categories_created'], 4)
+        self.assertEqual(self.names('A'), {'a1', 'b1', 'b2', 'e1'})
+        self.assertEqual(self.names('A__B'), {'b1', 'b2', 'e1'})
+
+    def test_unchanged_paths_are_skipped(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = load_changed_category_attributes(self.mapping)
+        self.assertEqual(stats['categories_unchanged'], 4)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+
+    def test_changed_path_removes_only_previously_imported_names(self):
+        category = Category.objects.get(path='A__B')
+        manual = Attribute.objects.create(name='manual')
+        category.add_attribute(manual)
+
+        stats = load_changed_category_attributes({**self.mapping, ('A', 'B'): {'b1', 'b3'}})
+
+        self.assertEqual(stats['categories_unchanged'], 3)
+        self.assertEqual(stats['assignments_removed'], 1)
+        # b2 went away; manual was assigned by hand and e1 propagated from A > B > E
+        self.assertEqual(self.names('A__B'), {'b1', 'b3', 'e1', 'manual'})
+        self.assertEqual(self.names('A'), {'a1', 'b1', 'b2', 'b3', 'e1', 'manual'})
+
+    def test_deleted_path_is_imported_again(self):
+        Category.objects.get(path='A__B').delete_subtree()
+        self.assertEqual(self.names('A__B'), set())
+
+        stats = load_changed_category_attributes(self.mapping)
+
+        self.assertEqual(stats['categories_unchanged'], 2)
+        self.assertEqual(stats['categories_created'], 2)
+        self.assertEqual(self.names('A__B'), {'b1', 'b2', 'e1'})
+        self.assertEqual(self.names('A__B__E'), {'e1'})
+
+    def test_renamed_path_is_imported_again(self):
+        category = Category.objects.get(path='D')
+        category.rename_and_move('Renamed', None)
+
+        stats = load_changed_category_attributes(self.mapping)
+
+        self.assertEqual(stats['categories_unchanged'], 3)
+        self.assertEqual(self.names('D'), {'d1'})
+        self.assertEqual(self.names('Renamed'), {'d1'})
+
+
+class ExportStreamingTests(TestCase):
+    """The export streams under both WSGI and ASGI and gives the same text."""
+
+    @classmethod
+    def setUpTestData(cls):
+        root = build_tree('export', depth=3, fanout=3)
+        attributes = Attribute.objects.bulk_create([Attribute(name=f'export-{index}') for index in range(4)])
+        bulk_assign_pairs(
+            (category_id, attribute.pk)
+            for category_id in root.get_descendants(include_self=True).values_list('id', flat=True)
+            for attribute in attributes
+        )
+
+    def test_sync_iterator_under_wsgi(self):
+        for export_format in ('csv', 'jsonl'):
+            response = self.client.get(reverse('export_category_attributes'), data={'format': export_format})
+            self.assertTrue(response.streaming)
+            self.assertFalse(response.is_async)
+
+    async def test_async_iterator_under_asgi(self):
+        for export_format, chunks in (('csv', csv_chunks), ('jsonl', jsonl_chunks)):
+            response = await self.async_client.get(
+                reverse('export_category_attributes'), data={'format': export_format},
+            )
+            self.assertTrue(response.streaming)
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+            expected = await sync_to_async(lambda: ''.join(chunks()))()
+            self.assertEqual(content.decode(), expected)
+
+    async def test_async_chunks_match_sync_chunks(self):
+        for export_format, chunks in (('csv', csv_chunks), ('jsonl', jsonl_chunks)):
+            streamed = [chunk async for chunk in export_chunks(export_format, chunk_size=3)]
+            expected = await sync_to_async(lambda: list(chunks(chunk_size=3)))()
+            self.assertGreater(len(streamed), 2)
+            self.assertEqual(streamed, expected)
+
+
+class EffectiveAttributeMirrorTests(TestCase):
+    """EffectiveAttribute must mirror the through table after every kind of change."""
+
+    def setUp(self):
+        self.first = build_tree('first', depth=3, fanout=2)
+        self.second = build_tree('second', depth=2, fanout=2)
+        self.branch = self.first.get_children()[0]
+        self.leaf = self.branch.get_children()[0]
+        self.pushed = Attribute.objects.create(name='pushed')
+        self.first.attributes.add(self.pushed)
+        self.pushed.save()
+        self.raised = Attribute.objects.create(name='raised')
+        self.leaf.add_attribute(self.raised)
+        self.assert_mirror()
+
+    def assert_mirror(self):
+        through = set(Attribute.categories.through.objects.values_list('category_id', 'attribute_id'))
+        rows = list(EffectiveAttribute.objects.values_list('category_id', 'attribute_id', 'source_id', 'inherited'))
+        self.assertEqual({(category_id, attribute_id) for category_id, attribute_id, _, _ in rows}, through)
+
+        categories = Category.objects.in_bulk()
+        for category_id, attribute_id, source_id, inherited in rows:
+            category = categories[category_id]
+            if not inherited:
+                self.assertEqual(source_id, category_id)
+            elif source_id is not None:
+                # A copy comes from an ancestor (pushed down) or a descendant (propagated up)
+                source = categories[source_id]
+                self.assertTrue(
+                    source.is_ancestor_of(category) or source.is_descendant_of(category),
+                    f"{category} inherits {attribute_id} from unrelated {source}",
+                )
+
+    def test_add_and_remove(self):
+        self.assertEqual(
+            EffectiveAttribute.objects.get(category=self.first, attribute=self.raised).source_id, self.leaf.pk,
+        )
+        self.leaf.remove_attribute(self.pushed)
+        self.assert_mirror()
+        self.branch.set_attributes([self.raised.pk])
+        self.assert_mirror()
+
+    def test_move(self):
+        self.branch.rename_and_move(self.branch.name, self.second)
+        self.assert_mirror()
+        # The copy pushed down from the old root stays but has lost its source
+        row = EffectiveAttribute.objects.get(category=self.leaf, attribute=self.pushed)
+        self.assertTrue(row.inherited)
+        self.assertIsNone(row.source_id)
+        self.assertEqual(
+            EffectiveAttribute.objects.get(category=self.second, attribute=self.raised).source_id, self.branch.pk,
+        )
+
+        self.branch.rename_and_move(self.branch.name, None)
+        self.assert_mirror()
+
+    def test_delete(self):
+        self.leaf.delete_subtree()
+        self.assert_mirror()
+        self.assertIsNone(EffectiveAttribute.objects.get(category=self.first, attribute=self.raised).source_id)
+        self.branch.delete()
+        self.assert_mirror()
+
+    def test_delete_view(self):
+        subtree_ids = set(self.branch.get_descendants(include_self=True).values_list('id', flat=True))
+
+        response = self.client.post(reverse('category_delete', args=[self.branch.pk]))
+
+        self.assertRedirects(response, reverse('category_list'), fetch_redirect_response=False)
+        self.assertFalse(Category.objects.filter(id__in=subtree_ids).exists())
+        self.assertFalse(Attribute.categories.through.objects.filter(category_id__in=subtree_ids).exists())
+        self.assert_mirror()
+        # The gap left by the subtree is closed, so a rebuild changes nothing
+        remaining = Category.objects.filter(tree_id=self.first.tree_id).order_by('lft')
+        numbering = list(remaining.values_list('id', 'lft', 'rght'))
+        Category.objects.partial_rebuild(self.first.tree_id)
+        self.assertEqual(list(remaining.values_list('id', 'lft', 'rght')), numbering)
+
+
+class PathLookupCacheTests(TestCase):
+    """category_id_for_path caches found ids in a bounded LRU and never misses."""
+
+    def setUp(self):
+        cache.clear()
+        self.root = build_tree('lookup', depth=2, fanout=3)
+        self.paths = list(Category.objects.order_by('path').values_list('path', flat=True))
+        tree_version()
+
+    def test_found_ids_are_cached(self):
+        self.assertEqual(category_id_for_path(self.root.path), self.root.pk)
+        # Only the shared tree version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(category_id_for_path(f'  {self.root.path} '), self.root.pk)
+
+    def test_misses_are_not_cached(self):
+        for index in range(3):
+            with self.assertNumQueries(2):
+                self.assertIsNone(category_id_for_path(f'missing-{index}'))
+        self.assertFalse(any(key.startswith('missing') for key in paths_module._path_ids.entries))
+
+    def test_size_is_bounded(self):
+        with mock.patch.object(paths_module._path_ids, 'max_size', 2):
+            for path in self.paths:
+                category_id_for_path(path)
+            self.assertEqual(list(paths_module._path_ids.entries), self.paths[-2:])
+
+
+class SearchTruncationTests(TestCase):
+    """The in-memory ranking applies the caller's filters before its cut-off."""
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.bulk_create(
+            [Category(name=f'match-{index:02}', path=f'match-{index:02}', lft=1, rght=2, tree_id=index + 1, level=0)
+             for index in range(20)],
+        )
+        Attribute.objects.bulk_create([Attribute(name=f'match-{index:02}') for index in range(20)])
+
+    def test_rank_categories_filters_before_truncating(self):
+        excluded = Category.objects.order_by('name')[:10].values('id')
+        with mock.patch('categories.search.MAX_RANKED_MATCHES', 5):
+            ranked = list(rank_categories(Category.objects.exclude(id__in=excluded), 'match'))
+        self.assertEqual([category.name for category in ranked], [f'match-{index}' for index in range(10, 15)])
+
+    def test_prefix_attributes_filters_before_truncating(self):
+        queryset = Attribute.objects.filter(name__gte='match-10')
+        with mock.patch('categories.search.MAX_RANKED_MATCHES', 5):
+            ranked = list(prefix_attributes(queryset, 'match').values_list('name', flat=True))
+            full = list(rank_attributes(queryset, 'match').values_list('name', flat=True))
+        expected = [f'match-{index}' for index in range(10, 15)]
+        self.assertEqual(ranked, expected)
+        self.assertEqual(full, expected)
+
+    def test_search_module_does_not_need_psycopg(self):
+        blocked = {name: None for name in sys.modules if name.startswith('django.contrib.postgres')}
+        blocked.update({
+            'psycopg': None,
+            'psycopg2': None,
+            'django.contrib.postgres.lookups': None,
+            'django.contrib.postgres.search': None,
+        })
+        with mock.patch.dict(sys.modules, blocked):
+            sys.modules.pop('categories.search')
+            module = importlib.import_module('categories.search')
+        self.assertTrue(module.rank_categories)
+
+
+class AsyncConditionalTests(TestCase):
+    """The async read endpoints answer with the same bodies and ETags as the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        self.root = build_tree('etag', depth=3, fanout=2)
+        self.requests = [
+            ('category_tree', 'async_category_tree', {'depth': 2}),
+            ('category_tree', 'async_category_tree', {}),
+            ('api_search_categories', 'async_search_categories', {'q': 'etag-1'}),
+        ]
+
+    def test_bodies_and_etags_match(self):
+        for sync_name, async_name, data in self.requests:
+            expected = self.client.get(reverse(sync_name), data=data)
+            # The version must come from the awaited cache read, not tree_version
+            with mock.patch('categories.api.tree_version', side_effect=AssertionError):
+                response = self.client.get(reverse(async_name), data=data)
+            self.assertEqual(response.content, expected.content)
+            self.assertTrue(response['ETag'])
+            self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_if_none_match(self):
+        for _, async_name, data in self.requests:
+            response = await self.async_client.get(reverse(async_name), data=data)
+            self.assertEqual(response.status_code, 200)
+            revalidated = await self.async_client.get(
+                reverse(async_name), data=data, headers={'If-None-Match': response['ETag']},
+            )
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated['ETag'], response['ETag'])
+
+
+class BulkAddAttributesTests(TestCase):
+    """The bulk add endpoint reports the rows it inserted and rejects non-integer ids."""
+
+    def setUp(self):
+        self.root = build_tree('bulk', depth=3, fanout=2)
+        self.leaves = list(Category.objects.filter(level=2).order_by('lft'))
+        self.existing = Attribute.objects.create(name='existing')
+        self.leaves[0].add_attribute(self.existing)
+
+    def post(self, assignments):
+        return self.client.post(
+            reverse('api_bulk_add_category_attributes'),
+            json.dumps({'assignments': assignments}),
+            content_type='application/json',
+        )
+
+    def test_created_and_duplicate_counts(self):
+        first, second, third, _ = (leaf.pk for leaf in self.leaves)
+        assignments = [
+            [first, self.existing.pk],  # already on the leaf and its ancestors
+            {'category': second, 'attribute': 'existing'},  # only the sibling is new
+            [first, 'added'],  # the leaf, its parent and the root
+            [first, ' added '],
+            [third, 'added'],  # the leaf and its parent
+        ]
+
+        summary = self.post(assignments).json()['summary']
+
+        self.assertEqual(summary['received'], 5)
+        self.assertEqual(summary['unique_pairs'], 4)
+        self.assertEqual(summary['attributes_created'], 1)
+        self.assertEqual(summary['assignments_created'], 6)
+        self.assertEqual(Attribute.objects.get(name='added').categories.count(), 5)
+
+        summary = self.post(assignments).json()['summary']
+        self.assertEqual(summary['attributes_created'], 0)
+        self.assertEqual(summary['assignments_created'], 0)
+
+    def test_rejects_non_integer_ids(self):
+        leaf = self.leaves[0].pk
+        for assignment in (
+            [True, 'added'],
+            [1.9, 'added'],
+            [str(leaf), 'added'],
+            {'category': None, 'attribute': 'added'},
+            [leaf, True],
+            [leaf, float(self.existing.pk)],
+            [leaf, ' '],
+            [leaf, 'added', 'extra'],
+        ):
+            with self.subTest(assignment=assignment):
+                response = self.post([[leaf, 'added'], assignment])
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'Invalid assignment at index 1')
+        self.assertFalse(Attribute.objects.filter(name='added').exists())
+
+    def test_rejects_unknown_ids(self):
+        response = self.post([[0, 'added'], [self.leaves[0].pk, 0]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing_categories'], [0])
+
+    @override_settings(CATEGORY_SYNC_TOKEN='sync-secret')
+    def test_service_token_replaces_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        url = reverse('api_bulk_add_category_attributes')
+        body = json.dumps({'assignments': [[self.leaves[0].pk, 'added']]})
+
+        # Without a CSRF cookie a plain service POST is refused
+        self.assertEqual(client.post(url, body, content_type='application/json').status_code, 403)
+        for header in ('Bearer wrong', 'sync-secret', 'Bearer '):
+            response = client.post(url, body, content_type='application/json', headers={'Authorization': header})
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(Attribute.objects.filter(name='added').exists())
+
+        response = client.post(
+            url, body, content_type='application/json', headers={'Authorization': 'Bearer sync-secret'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary']['assignments_created'], 3)
+
+        # Browsers keep using the CSRF token
+        client.cookies['csrftoken'] = 'x' * 32
+        response = client.post(url, body, content_type='application/json', headers={'X-CSRFToken': 'x' * 32})
+        self.assertEqual(response.status_code, 200)
+
+    def test_service_token_unset_refuses_bearer(self):
+        response = Client(enforce_csrf_checks=True).post(
+            reverse('api_bulk_add_category_attributes'),
+            json.dumps({'assignments': [[self.leaves[0].pk, 'added']]}),
+            content_type='application/json',
+            headers={'Authorization': 'Bearer '},
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+# Files as extract_category_and_attribute.py writes them: a header row, then
+# one attribute name per row. Category names are unique across the tree.
+IMPORT_FILES = {
+    'Home.csv': ['Brand', 'Colour'],
+    'Home__Kitchen.csv': ['Material', 'Brand', '', ' Capacity '],
+    'Home__Kitchen__Cookware_Sets.csv': ['Material', 'Pieces', 'Pieces'],
+    'Home__Bath__Towels.csv': ['Size', 'Colour'],
+    'Garden__Lawn___Edging.csv': ['Length'],
+    'Garden.csv': [],
+    'Toys__Puzzles.csv': ['Pieces', 'Age Range'],
+}
+
+
+class ImportModeTests(TestCase):
+    """Every import_category_attribute mode builds the same tree and assignments."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for filename, names in IMPORT_FILES.items():
+            with open(os.path.join(self.directory, filename), 'w', newline='') as f:
+                csv.writer(f).writerows([['attribute'], *([name] for name in names), []])
+        Path(self.directory, 'notes.txt').write_text('not a category file')
+
+    def import_snapshot(self, *args):
+        """Import the fixture directory and return the result, then roll it back."""
+        with transaction.atomic():
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                call_command('import_category_attribute', self.directory, *args)
+            categories = {
+                (path, name, parent_path, level, (rght - lft - 1) // 2)
+                for path, name, parent_path, level, lft, rght in Category.objects.values_list(
+                    'path', 'name', 'parent__path', 'level', 'lft', 'rght',
+                )
+            }
+            assignments = set(Attribute.categories.through.objects.values_list('category__path', 'attribute__name'))
+            transaction.set_rollback(True)
+        cache.clear()
+        return categories, assignments
+
+    def assert_same_import(self, *args):
+        expected = self.import_snapshot()
+        self.assertFalse(Category.objects.exists())
+        self.assertIn(('Garden__Lawn___Edging', 'Lawn___Edging', 'Garden', 1, 0), expected[0])
+        self.assertIn(('Home', 'Pieces'), expected[1])
+        self.assertIn(('Home__Kitchen', 'Capacity'), expected[1])
+        self.assertEqual(self.import_snapshot(*args), expected)
+
+    def test_bulk_matches_default(self):
+        self.assert_same_import('--bulk')
+
+    def test_workers_match_default(self):
+        self.assert_same_import('--workers', '2')
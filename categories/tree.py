@@ -0,0 +1,176 @@
+"""Array-backed snapshot of the category tree.
+
+``CategoryTree`` holds the MPTT columns of every category as parallel
+``array`` columns in tree order, built from one ``values_list`` query. In that
+order the subtree of a node is the contiguous run of ``subtree_size`` entries
+starting at the node, so descendant sets are slices and ancestor chains follow
+the parent index, without instantiating ``Category`` objects.
+"""
+from array import array
+
+from .models import Category
+
+
+class CategoryTree:
+    """Parallel arrays of id, parent index, tree id, lft, rght and level."""
+
+    def __init__(self, rows):
+        """``rows`` yields ``(id, parent_id, tree_id, lft, rght, level)`` in (tree_id, lft) order."""
+        self.ids = array('q')
+        self.parents = array('q')
+        self.tree_ids = array('q')
+        self.lft = array('q')
+        self.rght = array('q')
+        self.level = array('q')
+        self.parent_ids = []
+        self.index = {}
+        for category_id, parent_id, tree_id, lft, rght, level in rows:
+            self.index[category_id] = len(self.ids)
+            self.ids.append(category_id)
+            self.parent_ids.append(parent_id)
+            self.tree_ids.append(tree_id)
+            self.lft.append(lft)
+            self.rght.append(rght)
+            self.level.append(level)
+        # Parent ids become positions once every row is known; -1 marks a root
+        # (or a parent outside the loaded rows)
+        self.parents.extend(self.index.get(parent_id, -1) for parent_id in self.parent_ids)
+
+    @classmethod
+    def load(cls, queryset=None):
+        """Build the tree from ``queryset`` (all categories by default) in one query."""
+        queryset = Category.objects.all() if queryset is None else queryset
+        return cls(
+            queryset.order_by('tree_id', 'lft')
+            .values_list('id', 'parent_id', 'tree_id', 'lft', 'rght', 'level')
+            .iterator()
+        )
+
+    @classmethod
+    def load_trees(cls, category_ids):
+        """Build the trees that contain ``category_ids``."""
+        tree_ids = Category.objects.filter(id__in=list(category_ids)).values('tree_id')
+        return cls.load(Category.objects.filter(tree_id__in=tree_ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, category_id):
+        return category_id in self.index
+
+    def subtree_size(self, category_id):
+        """Number of categories in the subtree, the category included."""
+        position = self.index[category_id]
+        return (self.rght[position] - self.lft[position] + 1) // 2
+
+    def subtree_slice(self, category_id, include_self=True):
+        position = self.index[category_id]
+        end = position + (self.rght[position] - self.lft[position] + 1) // 2
+        return slice(position if include_self else position + 1, end)
+
+    def descendant_ids(self, category_id, include_self=False):
+        return self.ids[self.subtree_slice(category_id, include_self)].tolist()
+
+    def ancestor_ids(self, category_id, include_self=False):
+        """Ids from the root down to the category."""
+        position = self.index[category_id]
+        chain = [category_id] if include_self else []
+        position = self.parents[position]
+        while position >= 0:
+            chain.append(self.ids[position])
+            position = self.parents[position]
+        chain.reverse()
+        return chain
+
+    def ancestor_map(self, category_ids):
+        """``{id: (id, parent, ..., root)}`` for every known id in ``category_ids``.
+
+        Chains are shared between siblings, so the cost is bounded by the
+        number of distinct nodes on the paths rather than ids times depth.
+        """
+        closure = {}
+        for category_id in category_ids:
+            position = self.index.get(category_id)
+            if position is None or category_id in closure:
+                continue
+            chain = []
+            while position >= 0 and self.ids[position] not in closure:
+                chain.append(self.ids[position])
+                position = self.parents[position]
+            inherited = closure[self.ids[position]] if position >= 0 else ()
+            for node in reversed(chain):
+                inherited = (node,) + inherited
+                closure[node] = inherited
+        return {category_id: closure[category_id] for category_id in category_ids if category_id in closure}
+
+    def children_ids(self, category_id):
+        position = self.index[category_id]
+        child_level = self.level[position] + 1
+        return [
+            self.ids[index]
+            for index in range(position + 1, position + self.subtree_size(category_id))
+            if self.level[index] == child_level
+        ]
+
+    def validate(self):
+        """Return a list of MPTT inconsistencies (empty when the tree is sound).
+
+        Checks that every subtree is a contiguous, correctly nested range,
+        that levels and parent links agree with the nesting, and that each
+        tree's ``lft`` values start at 1 and have no gaps.
+        """
+        problems = []
+        stack = []
+        for position, category_id in enumerate(self.ids):
+            tree_id, lft, rght, level = (
+                self.tree_ids[position], self.lft[position], self.rght[position], self.level[position],
+            )
+            if stack and self.tree_ids[stack[-1]] != tree_id:
+                stack = []
+            while stack and self.rght[stack[-1]] < lft:
+                stack.pop()
+
+            if rght <= lft or (rght - lft) % 2 == 0:
+                problems.append(f"category {category_id}: invalid range lft={lft} rght={rght}")
+            parent_position = stack[-1] if stack else -1
+            if parent_position >= 0 and rght > self.rght[parent_position]:
+                problems.append(f"category {category_id}: range overlaps its parent")
+            if level != len(stack):
+                problems.append(f"category {category_id}: level {level}, expected {len(stack)}")
+            expected_parent = self.ids[parent_position] if parent_position >= 0 else None
+            if self.parent_ids[position] != expected_parent:
+                problems.append(
+                    f"category {category_id}: parent {self.parent_ids[position]}, "
+                    f"nesting says {expected_parent}"
+                )
+            if not self._contiguous(position):
+                problems.append(f"category {category_id}: subtree is not contiguous")
+            stack.append(position)
+        problems.extend(self._gaps())
+        return problems
+
+    def _contiguous(self, position):
+        """The ``subtree_size`` entries from ``position`` are exactly the nested range."""
+        tree_id, lft, rght = self.tree_ids[position], self.lft[position], self.rght[position]
+        end = position + (rght - lft + 1) // 2
+        if end > len(self.ids):
+            return False
+        last = end - 1
+        if self.tree_ids[last] != tree_id or self.rght[last] > rght:
+            return False
+        return end == len(self.ids) or self.tree_ids[end] != tree_id or self.lft[end] > rght
+
+    def _gaps(self):
+        """``lft``/``rght`` of each tree must be exactly 1 .. 2 * size."""
+        problems = []
+        start = 0
+        while start < len(self.ids):
+            tree_id = self.tree_ids[start]
+            end = start
+            while end < len(self.ids) and self.tree_ids[end] == tree_id:
+                end += 1
+            values = sorted(list(self.lft[start:end]) + list(self.rght[start:end]))
+            if values != list(range(1, 2 * (end - start) + 1)):
+                problems.append(f"tree {tree_id}: lft/rght values are not 1..{2 * (end - start)}")
+            start = end
+        return problems
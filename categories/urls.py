@@ -10,12 +10,17 @@ from .api import (
     delete_category,
     search_categories, 
     category_tree, 
+    category_tree_snapshot,
     category_attributes, 
     category_add_attribute as api_category_add_attribute, 
     category_add_attribute_by_name as api_category_add_attribute_by_name,
+    category_bulk_add_attributes as api_category_bulk_add_attributes,
     category_remove_attribute as api_category_remove_attribute, 
-    search_attributes
+    search_attributes,
+    export_category_attributes,
+    resolve_facets,
 )
+from . import async_api
 
 urlpatterns = [
     # Category URLs
@@ -36,6 +41,7 @@ urlpatterns = [
     
     path('api/categories/create/', create_category, name='api_create_category'),
     path('api/categories/tree/', category_tree, name='category_tree'),
+    path('api/categories/snapshot/', category_tree_snapshot, name='category_tree_snapshot'),
     path('api/categories/<int:pk>/attributes/', category_attributes, name='category_attributes'),
     path('api/categories/search/', search_categories, name='api_search_categories'),
     path('api/categories/<int:pk>/update/', update_category, name='api_update_category'),
@@ -51,8 +57,19 @@ urlpatterns = [
          api_category_add_attribute, name='api_add_category_attribute'),
     path('api/categories/<int:category_pk>/add-attribute-by-name/',
          api_category_add_attribute_by_name, name='category_add_attribute_by_name'),
+    path('api/categories/bulk-add-attributes/',
+         api_category_bulk_add_attributes, name='api_bulk_add_category_attributes'),
     path('api/categories/<int:category_pk>/remove-attribute/<int:attribute_pk>/', 
          api_category_remove_attribute, name='api_remove_category_attribute'),
     
     path('api/attributes/search/', search_attributes, name='search_attributes'),
+    path('api/facets/', resolve_facets, name='resolve_facets'),
+    path('api/export/', export_category_attributes, name='export_category_attributes'),
+
+    # Async variants of the read endpoints, for ASGI deployments
+    path('api/async/categories/tree/', async_api.category_tree, name='async_category_tree'),
+    path('api/async/categories/search/', async_api.search_categories, name='async_search_categories'),
+    path('api/async/categories/<int:pk>/attributes/', async_api.category_attributes,
+         name='async_category_attributes'),
+    path('api/async/attributes/search/', async_api.search_attributes, name='async_search_attributes'),
 ]
@@ -4,11 +4,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.core.paginator import Paginator
 
 from .models import Category, Attribute
+from .pagination import keyset_page
+from .propagation import attributes_not_assigned, categories_without_attribute
 from .forms import CategoryForm, AttributeForm
 
 
@@ -27,9 +28,7 @@ class CategoryListView(ListView):
         context['selected_category'] = first_category
         if first_category:
             context['attributes'] = first_category.attributes.all()
-            context['available_attributes'] = Attribute.objects.exclude(
-                id__in=first_category.attributes.values_list('id', flat=True)
-            )
+            context['available_attributes'] = attributes_not_assigned(first_category.pk)
         return context
 
 
@@ -70,6 +69,11 @@ class CategoryDeleteView(DeleteView):
     template_name = 'categories/category_confirm_delete.html'
     success_url = reverse_lazy('category_list')
 
+    def form_valid(self, form):
+        # Set-based subtree delete instead of the per-level cascade collector
+        self.object.delete_subtree()
+        return HttpResponseRedirect(self.get_success_url())
+
 
 class AttributeListView(ListView):
     model = Attribute
@@ -122,16 +126,22 @@ class AttributeDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Pagination for assigned_categories
+        context['per_page_options'] = (5, 10, 20, 50, 100)
         assigned_list = self.object.categories.all()
+        available_list = categories_without_attribute(self.object.pk)
+
+        if self.request.GET.get('paginate') == 'keyset':
+            # Cursor pagination on (name, id): deep pages cost the same as the first
+            context['assigned_categories'] = keyset_page(assigned_list, self.request.GET.get('assigned_cursor'))
+            context['available_categories'] = keyset_page(available_list, self.request.GET.get('available_cursor'))
+            return context
+
+        # Pagination for assigned_categories
         assigned_paginator = Paginator(assigned_list, 10)  # 10 per page
         assigned_page_number = self.request.GET.get('assigned_page')
         context['assigned_categories'] = assigned_paginator.get_page(assigned_page_number)
 
         # Pagination for available_categories
-        available_list = Category.objects.exclude(
-            id__in=self.object.categories.values_list('id', flat=True)
-        )
         available_paginator = Paginator(available_list, 10)  # 10 per page
         available_page_number = self.request.GET.get('available_page')
         context['available_categories'] = available_paginator.get_page(available_page_number)
@@ -144,26 +154,14 @@ def manage_category_attributes(request, pk):
     
     if request.method == 'POST':
         attribute_ids = request.POST.getlist('attributes')
-        with transaction.atomic():
-            
-            category.attributes.clear()
-
-            for attribute_id in attribute_ids:
-                attribute = Attribute.objects.get(pk=attribute_id)
-                category.attributes.add(attribute)
-                
-                for ancestor in category.get_ancestors(include_self=False):
-                    ancestor.attributes.add(attribute)
-
-            for descendant in category.get_descendants():
-                descendant.attributes.add(*category.attributes.all())
-            
-            messages.success(request, 'Attributes updated successfully.')
-            return redirect('category_detail', pk=category.pk)
+        # Only the difference from the current assignments is written
+        category.set_attributes(
+            Attribute.objects.filter(pk__in=attribute_ids).values_list('pk', flat=True)
+        )
+        messages.success(request, 'Attributes updated successfully.')
+        return redirect('category_detail', pk=category.pk)
     
-    available_attributes = Attribute.objects.exclude(
-        id__in=category.attributes.all().values_list('id', flat=True)
-    )
+    available_attributes = attributes_not_assigned(category.pk)
     
     context = {
         'category': category,
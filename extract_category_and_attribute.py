@@ -1,51 +1,75 @@
-import pandas as pd
+import argparse
 import os
-import re
-from tqdm import tqdm
+import time
 from collections import defaultdict
 
-# Config
-input_csv = "vertexai_feed.csv"
-output_dir = "output_files"
-chunksize = 10000  # Adjust based on your available memory
+import pandas as pd
+from tqdm import tqdm
+
+from categories.feed import DEFAULT_CHUNKSIZE, merge_keys, read_chunks, read_ranges
+from categories.parsing import sanitize_filename
+
+# Defaults, overridable from the command line
+DEFAULT_INPUT_CSV = "vertexai_feed.csv"
+DEFAULT_OUTPUT_DIR = "output_files"
+
+
+def extract(input_csv, chunksize=DEFAULT_CHUNKSIZE):
+    """Read the feed in chunks and return ({category path: keys}, rows read)."""
+    product_type_keys = defaultdict(set)
+    rows = 0
+    for partial, partial_rows in tqdm(read_chunks(input_csv, chunksize), desc="Processing Chunks"):
+        merge_keys(product_type_keys, partial)
+        rows += partial_rows
+    return product_type_keys, rows
 
-# Prepare output directory
-os.makedirs(output_dir, exist_ok=True)
 
-# Initialize dictionary for storing attribute keys per N-level category
-product_type_keys = defaultdict(set)
+def extract_parallel(input_csv, workers, chunksize=DEFAULT_CHUNKSIZE):
+    """Like ``extract`` but processes byte ranges of the feed in a process pool."""
+    product_type_keys = defaultdict(set)
+    rows = 0
+    for partial, partial_rows in tqdm(read_ranges(input_csv, workers, chunksize), desc="Processing Ranges"):
+        merge_keys(product_type_keys, partial)
+        rows += partial_rows
+    return product_type_keys, rows
 
 
-def sanitize_filename(name):
-    # Replace special characters with underscores and trim excessive underscores
-    return re.sub(r'[^\w\-,.\&]','',name)
+def save(product_type_keys, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for category_path, keys in product_type_keys.items():
+        safe_filename = sanitize_filename(category_path.replace(" > ", "__"))
+        output_file = os.path.join(output_dir, f"{safe_filename}.csv")
+        df_output = pd.DataFrame({"Attribute Keys": sorted(keys)})
+        df_output.to_csv(output_file, index=False)
+        print(f"✅ Saved: {output_file}")
 
-# Read CSV in chunks
-with pd.read_csv(input_csv, chunksize=chunksize) as reader:
-    for chunk in tqdm(reader, desc="Processing Chunks"):
-        for index, row in chunk.iterrows():
-            product_type_full = row.get("product_type", "")
-            filterable_attributes = row.get("filterable_attributes", "")
 
-            if pd.isna(product_type_full) or pd.isna(filterable_attributes):
-                continue
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Extract the filterable attribute keys of every N-level product_type category.",
+    )
+    parser.add_argument("--input", default=DEFAULT_INPUT_CSV, help="Vendor feed CSV file")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for the per-category CSV files")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Split the feed into byte ranges processed by this many processes "
+             "(requires one record per line)",
+    )
+    args = parser.parse_args(argv)
 
-            # Extract keys from attributes
-            attributes = filterable_attributes.split(",")
-            keys = {attr.split(":")[0].strip() for attr in attributes if ":" in attr}
+    started = time.monotonic()
+    if args.workers > 1:
+        product_type_keys, rows = extract_parallel(args.input, args.workers, chunksize=args.chunksize)
+    else:
+        product_type_keys, rows = extract(args.input, chunksize=args.chunksize)
+    save(product_type_keys, args.output_dir)
+    elapsed = time.monotonic() - started
 
-            # Create N-level categories
-            parts = [part.strip() for part in product_type_full.split(">")]
-            for i in range(1, len(parts) + 1):
-                category_path = " > ".join(parts[:i])
-                product_type_keys[category_path].update(keys)
+    print("🎉 Finished! All N-level categories processed.")
+    print(f"Processed {rows} rows into {len(product_type_keys)} categories "
+          f"in {elapsed:.2f}s ({rows / elapsed if elapsed > 0 else rows:.0f} rows/sec)")
 
-# Save results
-for category_path, keys in product_type_keys.items():
-    safe_filename = sanitize_filename(category_path.replace(" > ", "__"))
-    output_file = os.path.join(output_dir, f"{safe_filename}.csv")
-    df_output = pd.DataFrame({"Attribute Keys": sorted(keys)})
-    df_output.to_csv(output_file, index=False)
-    print(f"✅ Saved: {output_file}")
 
-print("🎉 Finished! All N-level categories processed.")
+if __name__ == "__main__":
+    main()
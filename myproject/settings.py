@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -105,6 +106,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# The category tree version and snapshot live here. Every process must see
+# the same cache, or imports run from another process never invalidate the
+# web workers' ETags and in-memory indexes; create the table with
+# "python manage.py createcachetable".
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "categories_cache",
+    }
+}
+
+
+# Category autocomplete: "database" searches in SQL on every request,
+# "memory" answers from per-process sorted name indexes.
+
+CATEGORY_SEARCH_BACKEND = "database"
+
+# Per-process LRU size of the product_type -> attributes facet cache and of
+# the path -> category id cache used by the attribute search
+CATEGORY_FACET_CACHE_SIZE = 10000
+
+# Shared secret the catalog-sync service sends as "Authorization: Bearer ..."
+# to the bulk assignment endpoint instead of a CSRF token. Unset disables it.
+CATEGORY_SYNC_TOKEN = os.environ.get("CATEGORY_SYNC_TOKEN", "")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 